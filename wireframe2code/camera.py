@@ -0,0 +1,225 @@
+import logging
+import threading
+import time
+from collections import deque
+from itertools import count
+from typing import Any
+from typing import Callable
+from typing import Optional
+from typing import Tuple
+
+import numpy as np
+from cv2 import cv2
+
+from sketch.capture import grayscale
+
+
+class Latest:
+
+    def __init__(self, size: int = 1):
+        """
+        A bounded queue which drops its oldest items to make room for new ones,
+        so that consumers always get the newest items.
+
+        :param size: maximum number of items waiting in the queue
+        """
+        self.size = size
+        self.dropped = 0
+        self.closed = False
+        self.__items = deque()
+        self.__condition = threading.Condition()
+
+    def put(self, item):
+        with self.__condition:
+            if len(self.__items) == self.size:
+                self.__items.popleft()
+                self.dropped += 1
+            self.__items.append(item)
+            self.__condition.notify()
+
+    def get(self, timeout: float = None):
+        """
+        :return: the oldest item in the queue; or `None` if no item arrives in time, or if the queue is closed and empty
+        """
+        with self.__condition:
+            self.__condition.wait_for(lambda: len(self.__items) > 0 or self.closed, timeout)
+            return self.__items.popleft() if len(self.__items) > 0 else None
+
+    def close(self):
+        """
+        Wakes up all consumers; items already in the queue can still be taken.
+        """
+        with self.__condition:
+            self.closed = True
+            self.__condition.notify_all()
+
+    def empty(self) -> bool:
+        with self.__condition:
+            return len(self.__items) == 0
+
+
+class Change:
+
+    def __init__(self, tolerance: float = 8., width: int = 32):
+        """
+        Tells whether frames differ from the last frame that was found to have changed.
+        Frames are compared by thumbnails, in which each pixel averages a block of the frame, which evens out
+        camera noise. Frames are compared to the last changed frame rather than the previous frame,
+        so that slow changes add up until they are noticed.
+
+        :param tolerance: largest difference in the gray level of any thumbnail pixel, for frames to be unchanged
+        :param width: width of the thumbnails
+        """
+        self.tolerance = tolerance
+        self.width = width
+        self.__reference = None
+
+    def __call__(self, frame: np.ndarray) -> bool:
+        height = max(1, round(self.width * frame.shape[0] / frame.shape[1]))
+        thumbnail = cv2.resize(grayscale(frame), (self.width, height), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+        reference = self.__reference
+        if reference is not None and reference.shape == thumbnail.shape \
+                and np.abs(thumbnail - reference).max() <= self.tolerance:
+            return False
+
+        self.__reference = thumbnail
+        return True
+
+
+class Pipeline:
+
+    def __init__(self, read: Callable[[], Optional[np.ndarray]], process: Callable[[np.ndarray], Any],
+                 workers: int = 1, interval: float = 5., changed: Callable[[np.ndarray], bool] = None):
+        """
+        Reads frames on a thread of their own, while `workers` other threads process the newest frame read.
+        Frames read while all workers are busy are dropped, and so are results that are not taken before
+        the result of a newer frame, so that consumers always see the newest frame.
+
+        :param read: returns the next frame, or `None` once there are no frames left
+        :param process: computes the result of a frame
+        :param interval: seconds between reports of frame rates
+        :param changed: tells whether a frame differs from the frames before it; unchanged frames are skipped
+        """
+        self.workers = workers
+        self.interval = interval
+        self.changed = changed
+
+        self.read = 0
+        self.skipped = 0
+        self.processed = 0
+        self.shown = 0
+
+        self.__reader = read
+        self.__process = process
+        self.__frames = Latest()
+        self.__results = Latest()
+        self.__sequence = count()
+        self.__published = -1
+        self.__running = 0
+        self.__error = None
+        self.__lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__threads = []
+        self.__start = None
+        self.__report = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        self.__start = self.__report = time.perf_counter()
+        self.__running = self.workers
+        self.__threads = [threading.Thread(target=self.__read, daemon=True)]
+        self.__threads += [threading.Thread(target=self.__work, daemon=True) for _ in range(self.workers)]
+        for thread in self.__threads:
+            thread.start()
+
+    def stop(self):
+        self.__stopped.set()
+        self.__frames.close()
+        for thread in self.__threads:
+            thread.join()
+        logging.info(self.__rates(time.perf_counter() - self.__start))
+
+    def done(self) -> bool:
+        """
+        :return: whether all frames were read and processed, and all results were taken
+        """
+        return self.__results.closed and self.__results.empty()
+
+    def get(self, timeout: float = None) -> Optional[Tuple[np.ndarray, Any]]:
+        """
+        :return: the newest frame processed, and its result; or `None` if no newer frame is processed in time
+        """
+        item = self.__results.get(timeout)
+        if self.__error is not None:
+            raise self.__error
+        if item is None:
+            return None
+
+        _, frame, result = item
+        self.shown += 1
+        self.__log()
+        return frame, result
+
+    def fps(self) -> float:
+        """
+        :return: number of results taken per second, since the pipeline started
+        """
+        return self.shown / max(time.perf_counter() - self.__start, 1e-9)
+
+    def __read(self):
+        while not self.__stopped.is_set():
+            frame = self.__reader()
+            if frame is None:
+                break
+            self.read += 1
+            if self.changed is not None and not self.changed(frame):
+                self.skipped += 1
+                continue
+            self.__frames.put((next(self.__sequence), frame))
+        self.__frames.close()
+
+    def __work(self):
+        while not self.__stopped.is_set():
+            item = self.__frames.get()
+            if item is None:
+                break
+
+            index, frame = item
+            try:
+                result = self.__process(frame)
+            except Exception as error:
+                self.__error = error
+                self.__stopped.set()
+                self.__frames.close()
+                break
+
+            with self.__lock:
+                self.processed += 1
+                # Workers may finish out of order, and a result must not push out the result of a newer frame
+                if index > self.__published:
+                    self.__published = index
+                    self.__results.put((index, frame, result))
+
+        with self.__lock:
+            self.__running -= 1
+            if self.__running == 0:
+                self.__results.close()
+
+    def __log(self):
+        now = time.perf_counter()
+        if now - self.__report >= self.interval:
+            self.__report = now
+            logging.info(self.__rates(now - self.__start))
+
+    def __rates(self, elapsed: float) -> str:
+        elapsed = max(elapsed, 1e-9)
+        return f"Showing {self.shown / elapsed:.1f} fps; processing {self.processed / elapsed:.1f} fps" \
+               f" of {self.read / elapsed:.1f} fps read, skipping '{self.skipped}' unchanged frames" \
+               f" and dropping '{self.__frames.dropped}' frames"
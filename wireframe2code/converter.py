@@ -0,0 +1,122 @@
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+
+import numpy as np
+from more_itertools import chunked
+
+from sketch.capture import Capture
+from sketch.capture import Stage
+from sketch.capture import grayscale
+from sketch.capture import resize
+from sketch.wireframe import Detector
+from sketch.wireframe import Inference
+from sketch.wireframe import Wireframe
+from web.writer import Html
+
+
+class Converter:
+
+    # Stages computed in a single call for images of the same size, stacked on top of each other,
+    # by the number of blank rows separating the images; these stages must treat blank rows as background
+    BATCHED = {'gamma_corrected': 0, 'inversed': 0, 'dilated': 1}
+
+    def __init__(self, batch_size: int = 8, transform=resize, detector: Detector = Detector.CONTOURS,
+                 inference: Inference = Inference.GAPS, nested: bool = False, **options):
+        """
+        Converts many images, sharing the work that does not depend on any single image.
+        The result of each image is identical to converting it on its own.
+
+        :param batch_size: number of images read ahead and preprocessed together
+        :param options: options of the capture of each image
+        """
+        self.batch_size = batch_size
+        self.transform = transform
+        self.detector = detector
+        self.inference = inference
+        self.nested = nested
+        self.options = options
+
+    def wireframes(self, images: Iterable[np.ndarray]) -> Iterator[Wireframe]:
+        """
+        :return: wireframe of each image, in the order images are provided; if captures write to a pool of buffers,
+        the source image of each wireframe is only valid until the next wireframe is taken
+        """
+        for batch in chunked(images, self.batch_size):
+            captures = [Capture(image, transform=self.transform, **self.options) for image in batch]
+
+            groups: Dict[tuple, List[Capture]] = {}
+            for capture in captures:
+                groups.setdefault((capture.image.shape, capture.image.dtype), []).append(capture)
+            for group in groups.values():
+                if len(group) > 1:
+                    self.__batch(group)
+
+            for capture in captures:
+                yield Wireframe(capture, self.detector, self.inference, self.nested)
+                capture.release()
+
+    def html(self, images: Iterable[np.ndarray]) -> Iterator[str]:
+        """
+        :return: HTML document of each image, in the order images are provided
+        """
+        for wireframe in self.wireframes(images):
+            yield Html.render(wireframe)
+
+    def __batch(self, captures: List[Capture]):
+        """
+        Computes the batched stages of captures of images of the same size, and replaces these stages
+        in each capture with their precomputed outputs.
+        """
+        overridden = set(self.options.get('stages') or {})
+        # Stages of the default pipeline convert their inputs to grayscale anyway, so it is done once for all images
+        default = len(overridden) == 0
+
+        if default and Capture.SOURCE in captures[0].stages['softened_binarization'].inputs:
+            sources = self.__split(grayscale(np.concatenate([capture.image for capture in captures])), len(captures))
+            for capture, source in zip(captures, sources):
+                capture.stages['softened_binarization'] = \
+                    self.__substitute(capture.stages['softened_binarization'], Capture.SOURCE, source)
+
+        for name, margin in Converter.BATCHED.items():
+            if name not in captures[0].stages or name in overridden:
+                continue
+
+            stage = captures[0].stages[name]
+            inputs = [self.__stack([capture.stage(dependency) for capture in captures], margin)
+                      for dependency in stage.inputs]
+            output = stage.function(*inputs)
+            if default and name == 'gamma_corrected':
+                output = grayscale(output)
+
+            for capture, part in zip(captures, self.__split(output, len(captures), margin)):
+                capture.stages[name] = Stage(lambda part=part: part)
+
+    @staticmethod
+    def __substitute(stage: Stage, name: str, value: np.ndarray) -> Stage:
+        """
+        :return: a copy of the provided stage, where the input called `name` is replaced with the provided value
+        """
+        inputs = tuple(dependency for dependency in stage.inputs if dependency != name)
+
+        def function(*outputs):
+            outputs = iter(outputs)
+            return stage.function(*(value if dependency == name else next(outputs) for dependency in stage.inputs))
+
+        return Stage(function, *inputs)
+
+    @staticmethod
+    def __stack(images: List[np.ndarray], margin: int = 0) -> np.ndarray:
+        if margin == 0:
+            return np.concatenate(images)
+
+        blank = np.zeros((margin,) + images[0].shape[1:], dtype=images[0].dtype)
+        parts = [blank] * (2 * len(images) - 1)
+        parts[::2] = images
+        return np.concatenate(parts)
+
+    @staticmethod
+    def __split(image: np.ndarray, count: int, margin: int = 0) -> List[np.ndarray]:
+        height = (image.shape[0] - margin * (count - 1)) // count
+        return [image[index * (height + margin):index * (height + margin) + height] for index in range(count)]
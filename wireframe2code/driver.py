@@ -1,61 +1,194 @@
 from __future__ import annotations
 
 import argparse
+import csv
+import glob
 import logging
+import os
 import subprocess
 import sys
+import time
+import traceback
 import webbrowser
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import List
 
 from cv2 import cv2
 
+from camera import Change
+from camera import Pipeline
+from sketch.capture import Buffers
 from sketch.capture import Capture
+from sketch.capture import Pyramid
+from sketch.capture import Scan
+from sketch.capture import load
+from sketch.capture import read
+from sketch.tracker import Tracker
 from sketch.wireframe import Wireframe
 from web.writer import Html
 
 
+IMAGE_EXTENSIONS = {'.bmp', '.jpeg', '.jpg', '.npy', '.png', '.tif', '.tiff', '.webp'}
+
+
 def main(args):
-    if args.camera and args.filename is not None:
-        raise ValueError("Camera and image cannot be simultaneously provided")
+    if sum([args.camera, args.filename is not None, args.batch is not None]) > 1:
+        raise ValueError("Only one of camera, image or batch can be provided")
+    check_nesting(args.pyramid, args.scan, args.nested)
+
+    if args.batch is not None:
+        # Batches run headless, so no windows are ever opened
+        consume_batch(args.batch, args.output, args.jobs, args.pyramid, args.scan, args.nested)
+        return
+
+    executor = ThreadPoolExecutor(args.workers) if args.workers > 1 else None
 
     if args.camera:
-        consume_camera(args.output)
+        consume_camera(args.output, executor=executor, pipelined=args.pipelined, workers=args.jobs or 1,
+                       tolerance=args.tolerance, tracked=args.track, reuse=args.reuse)
     elif args.filename is not None:
-        consume_file(args.filename, args.output, args.debug)
+        consume_file(args.filename, args.output, args.debug, executor, args.pyramid, args.scan, args.nested)
     else:
         raise ValueError("Must provide arguments")
 
+    if executor is not None:
+        executor.shutdown()
+
     cv2.destroyAllWindows()
 
 
-def consume_camera(destination: str, interval: int = 25, exit_key: chr = None):
+def consume_camera(destination: str, interval: int = 25, exit_key: chr = None, executor=None, pipelined: bool = False,
+                   workers: int = 1, tolerance: float = None, tracked: bool = False, reuse: bool = False):
+    """
+    :param pipelined: whether frames are read and processed on threads of their own, while the newest
+    processed frame is previewed; frames that arrive while all workers are busy are dropped
+    :param workers: number of threads processing frames, if pipelined
+    :param tolerance: if provided, frames that differ from the last analyzed frame by at most this many
+    gray levels are not analyzed, and the last wireframe is kept
+    :param tracked: whether placeholders are followed across frames, so that the HTML is only written again
+    once placeholders are added, removed or moved
+    :param reuse: whether frames are processed in arrays reused from earlier frames, instead of newly allocated ones
+    """
 
     def should_exit():
         if exit_key is not None:
             return ord(exit_key) == key & 0xFF
         return key != -1
 
-    capture = cv2.VideoCapture(0)
-    while True:
+    def read():
         can_read, frame = capture.read()
-        if can_read:
-            _, wireframe = write_html(frame, destination)
-
+        return frame if can_read else None
+
+    def analyze(frame):
+        with Capture(frame, executor=executor, buffers=buffers) as capture:
+            wireframe = Wireframe(capture)
+            if tracker is None:
+                # Lay widgets out on the worker, leaving only the HTML to render on the preview thread
+                wireframe.layout()
+            if pipelined and buffers is not None:
+                # The previewed image is copied out of the pool before the arrays of the frame are released,
+                # since other workers take them while the wireframe waits to be previewed;
+                # otherwise, the next frame is only captured once this one is previewed
+                wireframe.source = wireframe.source.copy()
+        return wireframe
+
+    def show(wireframe):
+        nonlocal analyzed
+        analyzed = wireframe
+        if tracker is None:
+            Html(destination).write(wireframe)
             preview_widgets(wireframe.source, wireframe)
+        else:
+            if tracker.update(wireframe.placeholders):
+                Html(destination).write(tracker.wireframe)
+            preview_widgets(wireframe.source, tracker.wireframe)
+
+    def repeat(frames):
+        # Unchanged frames are not analyzed, but still count as frames in which the placeholders of the last
+        # analyzed frame were detected, so that tracks appear and settle while the sketch stays still
+        if tracker is None or analyzed is None or frames == 0:
+            return
+        if any([tracker.update(analyzed.placeholders) for _ in range(frames)]):
+            Html(destination).write(tracker.wireframe)
+            preview_widgets(analyzed.source, tracker.wireframe)
+
+    changed = None if tolerance is None else Change(tolerance)
+    tracker = Tracker() if tracked else None
+    analyzed = None
+    buffers = Buffers() if reuse else None
+
+    capture = cv2.VideoCapture(0)
+    if pipelined:
+        # Windows can only be updated from the main thread, so previews are rendered here
+        with Pipeline(read, analyze, workers, changed=changed) as pipeline:
+            repeated = 0
+            while True:
+                result = pipeline.get(timeout=interval / 1000)
+                if result is not None:
+                    show(result[1])
+                # Frames skipped before any frame was analyzed are repeated once the first analyzed frame is shown
+                if analyzed is not None:
+                    skipped = pipeline.skipped
+                    repeat(skipped - repeated)
+                    repeated = skipped
+                if result is None and pipeline.done():
+                    logging.error("Can't read from camera")
+                    break
+
+                key = cv2.waitKey(1)
+                if should_exit():
+                    break
 
-            key = cv2.waitKey(interval)
-            if should_exit():
+    else:
+        while True:
+            can_read, frame = capture.read()
+            if can_read:
+                # The preview of the last wireframe is left as it is, while the sketch does not change
+                if changed is None or changed(frame):
+                    show(analyze(frame))
+                else:
+                    repeat(1)
+
+                key = cv2.waitKey(interval)
+                if should_exit():
+                    break
+            else:
+                logging.error("Can't read from camera")
                 break
-        else:
-            logging.error("Can't read from camera")
-            break
+
+    if buffers is not None:
+        logging.info(f"Allocated '{buffers.allocations}' pooled arrays")
 
     capture.release()
     cv2.destroyAllWindows()
 
 
-def write_html(image, destination):
-    capture = Capture(image)
-    wireframe = Wireframe(capture)
+def check_nesting(pyramid: bool = False, scan: bool = False, nested: bool = False):
+    """
+    Nested grids are laid out from the hierarchy of contours of the whole image at full resolution,
+    which a scan never holds, and which would undo the savings of a pyramid.
+    """
+    if nested and (pyramid or scan):
+        raise ValueError("Nested grids cannot be laid out from a pyramid or a scan")
+
+
+def write_html(image, destination, executor=None, scale=1., pyramid=False, scan=False, nested=False, lean=False):
+    """
+    :param lean: whether only what is needed to write HTML is kept, in which case the wireframe cannot be previewed;
+    intermediate images are freed as soon as they are consumed
+    """
+    check_nesting(pyramid, scan, nested)
+    if scan:
+        capture = Scan(image, executor=executor, scale=scale, preview=not lean)
+    elif pyramid:
+        capture = Pyramid(image, executor=executor, scale=scale, retain=() if lean else None)
+    else:
+        capture = Capture(image, executor=executor, scale=scale, retain=() if lean else None)
+    wireframe = Wireframe(capture, nested=nested, lean=lean)
 
     html = Html(destination)
     html.write(wireframe)
@@ -69,7 +202,8 @@ def preview_widgets(image, wireframe, title='Bounding Rectangles', color=(0, 255
     cv2.imshow(title, image)
 
 
-def consume_file(filename, destination: str, debug: bool = False):
+def consume_file(filename, destination: str, debug: bool = False, executor=None, pyramid: bool = False,
+                 scan: bool = False, nested: bool = False):
 
     def preview_preprocessing():
         for image in [capture.image] + capture.preprocess():
@@ -96,15 +230,15 @@ def consume_file(filename, destination: str, debug: bool = False):
         cv2.imshow('Grids', image)
         cv2.waitKey(0)
 
-    source = cv2.imread(filename)
-
-    capture, wireframe = write_html(source, destination)
+    source, scale = read_source(filename, pyramid, scan)
+    capture, wireframe = write_html(source, destination, executor, scale, pyramid, scan, nested)
     image = capture.image.copy()
 
     open_browser(destination + '/index.html')
 
     if debug:
-        preview_preprocessing()
+        if not scan:
+            preview_preprocessing()
         preview_contours()
         preview_squares()
         preview_grids()
@@ -113,6 +247,136 @@ def consume_file(filename, destination: str, debug: bool = False):
         cv2.waitKey(0)
 
 
+def read_source(filename, pyramid: bool = False, scan: bool = False):
+    if scan and filename.endswith('.npy'):
+        return load(filename), 1.
+    if pyramid:
+        # Placeholders are refined against the image at its full resolution
+        image = cv2.imread(filename)
+        if image is None:
+            raise IOError(f"'{filename}' is not a supported image")
+        return image, 1.
+    return read(filename)
+
+
+def consume_batch(pattern: str, destination: str, jobs: int = None, pyramid: bool = False, scan: bool = False,
+                  nested: bool = False, in_flight: int = None) -> List[dict]:
+    """
+    Converts many images on a pool of processes, writing the HTML of each image to a directory of its own.
+    A summary of each conversion is written to `summary.csv` in the destination.
+
+    :param pattern: directory of images, or glob pattern matching images
+    :param jobs: number of processes; defaults to the number of processors
+    :param in_flight: maximum number of images being converted or waiting to be, which bounds memory use;
+    defaults to twice the number of processes
+    :return: the summary of each conversion, in the order images were found
+    """
+    check_nesting(pyramid, scan, nested)
+    if os.path.isdir(pattern):
+        filenames = [os.path.join(pattern, name) for name in sorted(os.listdir(pattern))
+                     if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS]
+    else:
+        filenames = sorted(glob.glob(pattern, recursive=True))
+
+    jobs = os.cpu_count() if jobs is None else jobs
+    in_flight = 2 * jobs if in_flight is None else in_flight
+
+    directories = set()
+
+    def directory(filename):
+        name = os.path.splitext(os.path.basename(filename))[0]
+        unique, suffix = name, 1
+        while unique in directories:
+            suffix += 1
+            unique = f"{name}-{suffix}"
+        directories.add(unique)
+        return os.path.join(destination, unique)
+
+    items = [(filename, directory(filename)) for filename in filenames]
+    summaries = {}
+    pending = iter(items)
+    start = time.perf_counter()
+
+    def submit(executor, item):
+        return executor.submit(convert_file, *item, pyramid, scan, nested)
+
+    def isolate(item):
+        """
+        Converts an image on a process of its own, so that the image is blamed only if that process dies.
+        """
+        with ProcessPoolExecutor(1) as isolated:
+            try:
+                return submit(isolated, item).result()
+            except BrokenProcessPool:
+                filename, output = item
+                return {'filename': filename, 'output': output, 'status': 'failed', 'seconds': None,
+                        'error': 'Worker process terminated abruptly'}
+
+    executor = ProcessPoolExecutor(jobs)
+    futures = {}
+    try:
+        while True:
+            while len(futures) < in_flight:
+                item = next(pending, None)
+                if item is None:
+                    break
+                futures[submit(executor, item)] = item
+
+            if len(futures) == 0:
+                break
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            try:
+                for future in done:
+                    summary = future.result()
+                    summaries[summary['filename']] = summary
+                    del futures[future]
+            except BrokenProcessPool:
+                # A process died and took the pool down with it, along with every image still in flight
+                executor.shutdown(wait=False)
+                for item in futures.values():
+                    summaries[item[0]] = isolate(item)
+                futures.clear()
+                executor = ProcessPoolExecutor(jobs)
+    finally:
+        executor.shutdown()
+
+    summaries = [summaries[filename] for filename, _ in items]
+    elapsed = time.perf_counter() - start
+
+    os.makedirs(destination, exist_ok=True)
+    with open(os.path.join(destination, 'summary.csv'), 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=['filename', 'output', 'status', 'seconds', 'error'])
+        writer.writeheader()
+        writer.writerows(summaries)
+
+    failures = sum(summary['status'] != 'converted' for summary in summaries)
+    logging.info(f"Converted '{len(summaries) - failures}' of '{len(summaries)}' images in {elapsed:.2f}s"
+                 f" with '{jobs}' processes")
+    for summary in summaries:
+        if summary['status'] != 'converted':
+            logging.error(f"Failed to convert '{summary['filename']}': {summary['error']}")
+
+    return summaries
+
+
+def convert_file(filename, destination: str, pyramid: bool = False, scan: bool = False, nested: bool = False) -> dict:
+    """
+    Converts a single image of a batch, reporting failures instead of raising them.
+    Batches are never previewed, so only what is needed to write HTML is kept.
+    """
+    start = time.perf_counter()
+    try:
+        source, scale = read_source(filename, pyramid, scan)
+        write_html(source, destination, scale=scale, pyramid=pyramid, scan=scan, nested=nested, lean=True)
+    except Exception as error:
+        logging.debug(traceback.format_exc())
+        return {'filename': filename, 'output': destination, 'status': 'failed',
+                'seconds': round(time.perf_counter() - start, 3), 'error': f"{type(error).__name__}: {error}"}
+    return {'filename': filename, 'output': destination, 'status': 'converted',
+            'seconds': round(time.perf_counter() - start, 3), 'error': None}
+
+
 def open_browser(url):
     if sys.platform == 'darwin':
         subprocess.Popen(f"open {url}", shell=True)
@@ -132,6 +396,28 @@ if __name__ == "__main__":
                         required=True, help='Destination of generated HTML/JS/CSS files')
     parser.add_argument('-d', '--debug',
                         action='store_true', help='')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Number of threads used to preprocess images')
+    parser.add_argument('-p', '--pyramid',
+                        action='store_true', help='Detect at a low resolution and refine at full resolution')
+    parser.add_argument('-s', '--scan',
+                        action='store_true', help='Process large images in tiles; NumPy files are memory-mapped')
+    parser.add_argument('-b', '--batch', type=str,
+                        help='Directory or glob pattern of input images, converted without opening any window')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Number of processes converting images in batch mode, '
+                             'or of threads processing camera frames in pipelined mode')
+    parser.add_argument('-l', '--pipelined',
+                        action='store_true', help='Read, process and preview camera frames concurrently, '
+                                                  'dropping frames that cannot be processed in time')
+    parser.add_argument('-t', '--tolerance', type=float, default=None,
+                        help='Gray levels by which camera frames may differ without being analyzed again')
+    parser.add_argument('-r', '--track',
+                        action='store_true', help='Follow rectangles across camera frames, smoothing their placement')
+    parser.add_argument('-u', '--reuse',
+                        action='store_true', help='Process camera frames in arrays reused from earlier frames')
+    parser.add_argument('-n', '--nested',
+                        action='store_true', help='Lay out rectangles drawn inside other rectangles in nested grids')
 
     parsed_args, unparsed_args = parser.parse_known_args()
     main(parsed_args)
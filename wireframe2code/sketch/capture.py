@@ -1,52 +1,469 @@
+import os
+import threading
+from concurrent.futures import Executor
+from enum import Enum
+from functools import lru_cache
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
 import imutils
 import numpy as np
 from cv2 import cv2
 from cv2 import ximgproc
 
+from sketch.shape import are_rectangles
+
+
+WIDTH = 640
+# Structuring element of the morphological operations of the pipeline
+KERNEL = np.ones((3, 3), np.uint8)
+
+
+def grayscale(image):
+    """
+    Converts a BGR image to grayscale; images that are already grayscale are returned as they are.
+    """
+    return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def resize(image, width=WIDTH, dst=None):
+    """
+    Shrinks the provided image to the given width, if it is any wider.
+
+    :param dst: array the shrunk image is written to, if it has the shape of the shrunk image
+    """
+    if image.shape[1] <= width:
+        return image
+    return cv2.resize(image, _shrunk_size(image.shape, width), dst=dst, interpolation=cv2.INTER_AREA)
+
+
+def _shrunk_size(shape: Tuple[int, ...], width: int) -> Tuple[int, int]:
+    """
+    :return: width and height of an image of the provided shape, shrunk to the given width
+    """
+    return width, int(shape[0] * (width / float(shape[1])))
+
+
+def read(filename: str, width: int = WIDTH) -> Tuple[np.ndarray, float]:
+    """
+    Decodes an image file, at the lowest resolution that is still at least `width` pixels across.
+    JPEG images are decoded directly at a reduced scale, which skips most of the decoding work for large photos.
+    Other formats can only be decoded in full, and are then shrunk by area averaging, so that thin strokes are kept.
+
+    :return: the decoded image, and its scale relative to the image at full resolution
+    """
+    data = np.fromfile(filename, dtype=np.uint8)
+    dimensions = _jpeg_dimensions(data)
+
+    flag = cv2.IMREAD_COLOR
+    if dimensions is not None:
+        reductions = {8: cv2.IMREAD_REDUCED_COLOR_8, 4: cv2.IMREAD_REDUCED_COLOR_4, 2: cv2.IMREAD_REDUCED_COLOR_2}
+        flag = reductions.get(_reduction(dimensions, width), flag)
+
+    image = cv2.imdecode(data, flag)
+    if image is None:
+        raise IOError(f"'{filename}' is not a supported image")
+
+    if dimensions is None:
+        dimensions = image.shape[1], image.shape[0]
+        factor = _reduction(dimensions, width)
+        if factor > 1:
+            # Sizes are rounded up, as they are by reduced JPEG decoding
+            size = -(-dimensions[0] // factor), -(-dimensions[1] // factor)
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    scale = max(image.shape[:2]) / max(dimensions)
+    return image, scale
+
+
+def _reduction(dimensions: Tuple[int, int], width: int) -> int:
+    """
+    :return: largest factor, among those JPEG images can be decoded at, which keeps an image at least `width` across
+    """
+    # The smaller dimension is used, since images may be rotated according to their orientation tag
+    shortest = min(dimensions)
+    return next((factor for factor in (8, 4, 2) if shortest // factor >= width), 1)
+
+
+def _jpeg_dimensions(data: np.ndarray) -> Optional[Tuple[int, int]]:
+    """
+    Reads the width and height of a JPEG image from its header, without decoding it.
+
+    :return: the dimensions of the image, or `None` if it is not a JPEG image
+    """
+    data = data.tobytes() if len(data) < 64 * 1024 else data[:64 * 1024].tobytes()
+
+    if data.startswith(b'\xff\xd8'):
+        # Walk through the segments until a start-of-frame segment, which holds the dimensions
+        start_of_frame = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+        index = 2
+        while index + 9 < len(data) and data[index] == 0xFF:
+            marker = data[index + 1]
+            if marker == 0xFF:
+                index += 1
+                continue
+            if marker in start_of_frame:
+                return int.from_bytes(data[index + 7:index + 9], 'big'), int.from_bytes(data[index + 5:index + 7], 'big')
+            index += 2 + int.from_bytes(data[index + 2:index + 4], 'big')
+
+    return None
+
+
+def load(source, shape: Tuple[int, ...] = None, dtype=np.uint8, offset: int = 0) -> np.ndarray:
+    """
+    Maps an image onto memory, without reading it.
+
+    :param source: path to a NumPy `.npy` file; or, if `shape` is provided, path to a file or a buffer of raw pixels
+    :param shape: shape of the image in a raw file or buffer, e.g. `(height, width, 3)` for BGR pixels
+    :param offset: number of bytes preceding the pixels in a raw file or buffer
+    """
+    if shape is None:
+        return np.load(source, mmap_mode='r')
+    if isinstance(source, (str, os.PathLike)):
+        return np.memmap(source, dtype=dtype, mode='r', offset=offset, shape=shape)
+    return np.frombuffer(source, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+
+
+class Tiles:
+
+    def __init__(self, executor: Executor = None, count: int = 1, alignment: int = 1):
+        """
+        Splits images into horizontal tiles, and runs image operations on each tile.
+
+        :param executor: executor on which tiles are processed; if absent, images are processed whole
+        :param count: maximum number of tiles
+        :param alignment: tile boundaries are placed on multiples of this value
+        """
+        self.executor = executor
+        self.count = count
+        self.alignment = alignment
+
+    def __call__(self, function, *images, halo=0, out: np.ndarray = None):
+        """
+        Applies `function` to each tile of the provided images, and stitches the results together.
+        Each tile is extended by `halo` rows on both sides, so that the stitched result is identical to
+        applying `function` to the whole images, as long as each output pixel depends only on input pixels
+        at most `halo` rows away.
+
+        :param out: array the result is written to; if provided, `function` must accept a `dst` array
+        which it may write its output to
+        """
+        if self.executor is None:
+            return function(*images) if out is None else function(*images, dst=out)
+
+        height = images[0].shape[0]
+        cells = -(-height // self.alignment)
+        tile_height = -(-cells // self.count) * self.alignment
+
+        def apply(start):
+            end = min(height, start + tile_height)
+            top = max(0, start - halo)
+            bottom = min(height, end + halo)
+            output = function(*(image[top:bottom] for image in images))
+            if out is None:
+                return output[start - top:end - top]
+            out[start:end] = output[start - top:end - top]
+
+        tiles = list(self.executor.map(apply, range(0, height, tile_height)))
+        return np.concatenate(tiles) if out is None else out
+
+
+class Stage:
+
+    def __init__(self, function: Callable[..., np.ndarray], *inputs: str):
+        """
+        A preprocessing step of a capture.
+
+        :param function: computes the output of this stage, given the outputs of `inputs` in the same order
+        :param inputs: names of the stages this stage depends on, where `Capture.SOURCE` is the captured image
+        """
+        self.function = function
+        self.inputs = inputs
+
+
+class Buffers:
+
+    def __init__(self):
+        """
+        A pool of arrays, which captures write their outputs to instead of allocating new arrays,
+        for as long as images keep the same size.
+        Each capture checks out a set of arrays until it is released, so the outputs of a capture are valid
+        until then; a new set is allocated while every set is in use.
+        Stages still allocate temporary arrays while they run, and thinning allocates its output,
+        so only the arrays that a capture keeps are reused.
+        """
+        # Number of arrays allocated by the pool, which stops growing once every array was allocated
+        self.allocations = 0
+        self.__free: List[Dict[tuple, np.ndarray]] = []
+        self.__lock = threading.Lock()
+
+    def take(self) -> Dict[tuple, np.ndarray]:
+        """
+        :return: a set of arrays that no other capture writes to, until it is released
+        """
+        with self.__lock:
+            return self.__free.pop() if len(self.__free) > 0 else {}
+
+    def release(self, arrays: Dict[tuple, np.ndarray]):
+        """
+        Returns a set of arrays to the pool, to be written to by later captures.
+        """
+        with self.__lock:
+            self.__free.append(arrays)
+
+    def array(self, arrays: Dict[tuple, np.ndarray], name: str, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """
+        :return: the array of the provided set with the provided name, shape and type
+        """
+        key = name, tuple(shape), np.dtype(dtype)
+        if key not in arrays:
+            arrays[key] = np.empty(shape, dtype)
+            with self.__lock:
+                self.allocations += 1
+        return arrays[key]
+
+
+class Binarization(Enum):
+
+    # Block-wise median thresholding, softened with a sigmoid; robust, but costs grow with the block size
+    ADAPTIVE_MEDIAN = 'adaptive_median'
+    # Sauvola thresholding from integral images, in time proportional to the number of pixels
+    SAUVOLA = 'sauvola'
+    # Local mean thresholding using OpenCV's box filter, in time proportional to the number of pixels
+    ADAPTIVE_MEAN = 'adaptive_mean'
+
 
 class Capture:
 
+    SOURCE = 'image'
+    # Block-wise stages are aligned to multiples of this size
+    BLOCK_SIZE = 40
+
     def __init__(self,
                  image,
-                 transform=lambda image: image if image.shape[0] <= 640 else imutils.resize(image, width=640)):
+                 transform=resize,
+                 vectorized=True,
+                 executor: Executor = None,
+                 tiles: int = None,
+                 binarization: Binarization = Binarization.ADAPTIVE_MEDIAN,
+                 stages: Dict[str, Optional[Stage]] = None,
+                 retain: Iterable[str] = None,
+                 scale: float = 1.,
+                 buffers: Buffers = None):
+        """
+        :param scale: scale of the provided image relative to the original image, if it was already resized
+        :param vectorized: whether block-wise stages are computed for all blocks at once,
+        instead of one block at a time
+        :param executor: if provided, preprocessing stages are split into tiles which are processed on this executor
+        :param tiles: number of tiles to split stages into; defaults to the number of processors
+        :param binarization: strategy used to separate ink from paper
+        :param stages: stages to add to, or replace in the default pipeline; stages mapped to `None` are removed
+        :param retain: names of the stages whose outputs are kept once computed; defaults to all stages
+        :param buffers: if provided, the image and the outputs of stages are written to arrays of this pool,
+        until the capture is released
+        """
+        self.__buffers = buffers
+        self.__arrays = None if buffers is None else buffers.take()
+
         # TODO: Determine where to resize image
         # TODO: Determine optimal image size for better approximation and performance
-        self.image = transform(image)
+        if transform is resize and buffers is not None and image.shape[1] > WIDTH:
+            width, height = _shrunk_size(image.shape, WIDTH)
+            self.image = resize(image, dst=self.buffer(Capture.SOURCE, (height, width) + image.shape[2:], image.dtype))
+        else:
+            self.image = transform(image)
+        # Coordinates in the captured image are divided by this factor to map them onto the original image.
+        # It is only kept for callers which need original coordinates: layouts depend on where placeholders are
+        # relative to each other, which scaling does not change
+        self.scale = scale * self.image.shape[1] / image.shape[1]
+        self.vectorized = vectorized
+        self.executor = executor
+        self.tiles = os.cpu_count() if tiles is None else tiles
+        self.binarization = binarization
 
-    def preprocess(self):
-        block_size = 40
+        self.stages = self.__pipeline()
+        for name, stage in ({} if stages is None else stages).items():
+            if stage is None:
+                del self.stages[name]
+            else:
+                self.stages[name] = stage
+
+        self.retain = tuple(self.stages) if retain is None else tuple(retain)
+        unknown = set(self.retain) - set(self.stages)
+        if len(unknown) > 0:
+            raise ValueError(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+        self.__outputs = {}
+        self.__contours = {}
+        self.__hierarchies = {}
+
+    def __pipeline(self) -> Dict[str, Stage]:
+        block_size = Capture.BLOCK_SIZE
         delta = 25
+        window_size = block_size + 1
+
+        # Block-wise stages are exact as long as tiles are aligned with blocks, and overlap by a block
+        def tiled(*args, **kwargs):
+            return Tiles(self.executor, self.tiles, block_size)(*args, **kwargs)
+
+        # Outputs of stages are written to arrays of the pool of buffers, if any
+        def gray(name, image):
+            return self.buffer(name, image.shape[:2])
+
+        if self.binarization is Binarization.SAUVOLA:
+            binarized = Stage(
+                lambda image: tiled(lambda tile, dst=None: Capture.__sauvola_binarize(tile, window_size, dst=dst),
+                                    image, halo=window_size // 2 + 1, out=gray('adaptively_binarized', image)),
+                'gamma_corrected')
+            softened = Stage(lambda mask: mask, 'adaptively_binarized')
+        elif self.binarization is Binarization.ADAPTIVE_MEAN:
+            binarized = Stage(
+                lambda image: tiled(lambda tile, dst=None: Capture.__mean_binarize(tile, window_size, delta / 2, dst),
+                                    image, halo=window_size // 2 + 1, out=gray('adaptively_binarized', image)),
+                'gamma_corrected')
+            softened = Stage(lambda mask: mask, 'adaptively_binarized')
+        else:
+            binarized = Stage(
+                lambda image: Capture.__adaptively_binarize(image, block_size, delta, self.vectorized, tiled,
+                                                            gray('adaptively_binarized', image)),
+                'gamma_corrected')
+            softened = Stage(
+                lambda image, mask: Capture.__soften_binarization(image, mask, block_size, self.vectorized, tiled,
+                                                                  gray('softened_binarization', image)),
+                Capture.SOURCE, 'adaptively_binarized')
+
+        return {
+            'gamma_corrected': Stage(
+                lambda image: tiled(Capture.__adjust_gamma, image,
+                                    out=self.buffer('gamma_corrected', image.shape, image.dtype)),
+                Capture.SOURCE),
+            'adaptively_binarized': binarized,
+            'softened_binarization': softened,
+            'inversed': Stage(
+                lambda image: tiled(
+                    lambda tile, dst=None: cv2.threshold(tile, 127, 255, cv2.THRESH_BINARY_INV, dst=dst)[1],
+                    image, out=gray('inversed', image)),
+                'softened_binarization'),
+            'dilated': Stage(
+                lambda image: tiled(lambda tile, dst=None: cv2.dilate(tile, kernel=None, dst=dst, iterations=1),
+                                    image, halo=1, out=gray('dilated', image)),
+                'inversed'),
+            # Thinning always allocates its output, ignoring any array provided to write it to
+            'thinned': Stage(
+                lambda image: ximgproc.thinning(image, thinningType=cv2.ximgproc.THINNING_ZHANGSUEN),
+                'dilated'),
+        }
+
+    def preprocess(self):
+        return [self.stage(name) for name in self.stages]
+
+    def buffer(self, name: str, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """
+        :return: array which an output called `name` can be written to; if this capture has a pool of buffers,
+        the array is reused by later captures of images of the same size
+        """
+        if self.__arrays is None:
+            return np.empty(shape, dtype)
+        return self.__buffers.array(self.__arrays, name, shape, dtype)
+
+    def release(self):
+        """
+        Returns the arrays of this capture to its pool of buffers, if any, so that later captures write to them.
+        Outputs computed so far, and wireframes found from them, may be written over from then on.
+        """
+        if self.__arrays is None:
+            return
+        self.__outputs.clear()
+        self.__buffers.release(self.__arrays)
+        self.__arrays = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def stage(self, name: str) -> np.ndarray:
+        """
+        Computes the output of a preprocessing stage, pulling only the stages it depends on.
+        Outputs of retained stages are computed only once; they must not be modified.
+        """
+        if name == Capture.SOURCE:
+            return self.image
+        if name in self.__outputs:
+            return self.__outputs[name]
+        if name not in self.stages:
+            raise ValueError(f"Unknown stage: {name}")
+
+        stage = self.stages[name]
+        output = stage.function(*(self.stage(dependency) for dependency in stage.inputs))
+        if name in self.retain:
+            self.__outputs[name] = output
+        return output
+
+    def invalidate(self, name: str = None):
+        """
+        Discards the output of a stage, and of all stages that depend on it.
+        If no stage is provided, all outputs are discarded.
+        """
+        if name is None:
+            self.__outputs.clear()
+            self.__contours.clear()
+            self.__hierarchies.clear()
+            return
+        if name not in self.stages:
+            raise ValueError(f"Unknown stage: {name}")
+
+        invalid = {name}
+        while True:
+            dependents = {other for other, stage in self.stages.items() if invalid.intersection(stage.inputs)}
+            if dependents <= invalid:
+                break
+            invalid |= dependents
 
-        gamma_corrected = Capture.__adjust_gamma(self.image)
-        adaptively_binarized = Capture.__adaptively_binarize(gamma_corrected, block_size, delta)
-        softened_binarization = Capture.__soften_binarization(self.image, adaptively_binarized, block_size)
-        inversed = cv2.threshold(softened_binarization, 127, 255, cv2.THRESH_BINARY_INV)[1]
-        dilated = cv2.dilate(inversed, kernel=None, iterations=1)
-        thinned = ximgproc.thinning(dilated, thinningType=cv2.ximgproc.THINNING_ZHANGSUEN)
+        for stage in invalid:
+            self.__outputs.pop(stage, None)
+            self.__contours.pop(stage, None)
+            self.__hierarchies.pop(stage, None)
 
-        return [gamma_corrected, adaptively_binarized, softened_binarization, inversed, dilated, thinned]
+    def output(self) -> str:
+        """
+        :return: the name of the last stage of the pipeline, from which contours are found by default
+        """
+        return list(self.stages)[-1]
 
     @staticmethod
-    def __adjust_gamma(image, gamma=1.2):
-        # Build a lookup table mapping the pixel values [0, 255] to their adjusted gamma values
+    def __adjust_gamma(image, gamma=1.2, dst=None):
+        # Apply gamma correction using the lookup table
+        return cv2.LUT(image, Capture.__gamma_table(gamma), dst=dst)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def __gamma_table(gamma):
+        """
+        Builds a lookup table mapping the pixel values [0, 255] to their adjusted gamma values, once for each gamma.
+        """
         inverse_gamma = 1.0 / gamma
         table = np.array([((i / 255.0) ** inverse_gamma) * 255 for i in np.arange(0, 256)]).astype("uint8")
-        # Apply gamma correction using the lookup table
-        return cv2.LUT(image, table)
+        table.flags.writeable = False
+        return table
 
     @staticmethod
-    def __adaptively_binarize(image, block_size, delta):
+    def __adaptively_binarize(image, block_size, delta, vectorized=True, tiled=Tiles(), dst=None):
         def preprocess(image):
             """
             Do necessary noise cleaning.
             """
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            image = grayscale(image)
             image = cv2.medianBlur(image, 3)
             return 255 - image
 
-        def postprocess(image):
-            kernel = np.ones((3, 3), np.uint8)
-            image = cv2.morphologyEx(image, cv2.MORPH_OPEN, kernel)
+        def postprocess(image, dst=None):
+            image = cv2.morphologyEx(image, cv2.MORPH_OPEN, KERNEL, dst=dst)
             return image
 
         def apply_adaptive_median_thresholding(image_slice, delta):
@@ -60,8 +477,7 @@ class Capture:
             median = np.median(image_slice)
             output = np.zeros_like(image_slice)
             output[image_slice - median < delta] = 255
-            kernel = np.ones((3, 3), np.uint8)
-            output = 255 - cv2.dilate(255 - output, kernel, iterations=2)
+            output = 255 - cv2.dilate(255 - output, KERNEL, iterations=2)
             return output
 
         def binarize_by_block(image, block_size, delta):
@@ -76,11 +492,179 @@ class Capture:
                     output[index] = apply_adaptive_median_thresholding(image[index], delta)
             return output
 
-        preprocessed = preprocess(image)
-        binarized = binarize_by_block(preprocessed, block_size, delta)
-        postprocessed = postprocess(binarized)
+        def binarize_all_blocks(image, block_size, delta):
+            """
+            Equivalent to `binarize_by_block`, but thresholds and dilates every block in a single call.
+            Each pixel keeps the value of the last block written over it, so only that block's median is needed.
+            The blocks are laid side by side in a mosaic, separated by a margin as wide as the dilation's reach.
+            """
+            reach = 2
+            medians = Capture.__block_medians(image, block_size)
+            source_rows, block_rows, output_rows = Capture.__block_mosaic(image.shape[0], block_size, reach)
+            source_cols, block_cols, output_cols = Capture.__block_mosaic(image.shape[1], block_size, reach)
+
+            mosaic = image[np.ix_(source_rows, source_cols)]
+            median = medians[np.ix_(block_rows, block_cols)]
+
+            output = np.zeros_like(mosaic)
+            output[mosaic - median >= delta] = 255
+            output[source_rows < 0, :] = 0
+            output[:, source_cols < 0] = 0
+            output = 255 - cv2.dilate(output, KERNEL, iterations=reach)
+            return output[np.ix_(output_rows, output_cols)]
+
+        binarize = binarize_all_blocks if vectorized else binarize_by_block
+
+        preprocessed = tiled(preprocess, image, halo=1)
+        binarized = tiled(lambda image: binarize(image, block_size, delta), preprocessed, halo=block_size)
+        postprocessed = tiled(postprocess, binarized, halo=2, out=dst)
         return postprocessed
 
+    @staticmethod
+    def __sauvola_binarize(image, window_size, k=0.2, r=128, dst=None):
+        """
+        Keeps pixels darker than `mean * (1 + k * (deviation / r - 1))` of their surrounding window.
+        Window sums are read from integral images, so costs do not depend on the window size.
+        """
+        image = grayscale(image)
+        image = cv2.medianBlur(image, 3)
+        sums, squared_sums = cv2.integral2(image, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+        rows, cols = image.shape
+        radius = window_size // 2
+
+        def window_sum(integral):
+            # Padding with edge values clips windows to the image, so that window corners are plain slices
+            integral = np.pad(integral, radius, mode='edge')
+            start = slice(0, rows), slice(0, cols)
+            end = slice(window_size, window_size + rows), slice(window_size, window_size + cols)
+            return integral[end[0], end[1]] - integral[start[0], end[1]] \
+                - integral[end[0], start[1]] + integral[start[0], start[1]]
+
+        def window_length(length):
+            offsets = np.arange(length)
+            return np.minimum(offsets + radius + 1, length) - np.maximum(offsets - radius, 0)
+
+        area = window_length(rows)[:, None] * window_length(cols)[None, :]
+        mean = window_sum(sums) / area
+        deviation = np.sqrt(np.maximum(window_sum(squared_sums) / area - mean ** 2, 0))
+        threshold = mean * (1 + k * (deviation / r - 1))
+
+        output = np.empty_like(image) if dst is None else dst
+        output.fill(0)
+        output[image > threshold] = 255
+        return output
+
+    @staticmethod
+    def __mean_binarize(image, window_size, delta, dst=None):
+        """
+        Keeps pixels darker than the mean of their surrounding window by more than `delta`.
+        """
+        image = grayscale(image)
+        image = cv2.medianBlur(image, 3)
+        return cv2.adaptiveThreshold(image, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, window_size, delta,
+                                     dst=dst)
+
+    @staticmethod
+    def __block_histograms(image, block_size, mask=None):
+        """
+        Computes the intensity histogram of every block generated by `__get_block_index`.
+        A block starting at cell (i, j) spans cells (i - 1, j - 1) to (i, j), so histograms are computed
+        once per cell and summed over neighboring cells.
+
+        :param mask: if provided, only pixels where the mask is non-zero are counted
+        :return: array of shape (block rows, block columns, 256)
+        """
+        rows = -(-image.shape[0] // block_size)
+        cols = -(-image.shape[1] // block_size)
+
+        cell_rows = np.arange(image.shape[0]) // block_size
+        cell_cols = np.arange(image.shape[1]) // block_size
+        bins = (cell_rows[:, None] * cols + cell_cols[None, :]) * 256 + image
+        if mask is not None:
+            bins = bins[mask != 0]
+
+        cells = np.zeros((rows + 1, cols + 1, 256), np.int64)
+        cells[1:, 1:] = np.bincount(bins.ravel(), minlength=rows * cols * 256).reshape((rows, cols, 256))
+        return cells[:-1, :-1] + cells[:-1, 1:] + cells[1:, :-1] + cells[1:, 1:]
+
+    @staticmethod
+    def __block_medians(image, block_size):
+        """
+        :return: the median intensity of every block generated by `__get_block_index`
+        """
+        histograms = Capture.__block_histograms(image, block_size)
+        counts = np.cumsum(histograms, axis=-1)
+        size = counts[..., -1:]
+        lower = np.argmax(counts > (size - 1) // 2, axis=-1)
+        upper = np.argmax(counts > size // 2, axis=-1)
+        return (lower + upper) / 2
+
+    @staticmethod
+    def __block_otsu(histograms):
+        """
+        Computes Otsu's threshold from every histogram at once, following OpenCV's implementation
+        step by step so that the same thresholds are chosen.
+        """
+        shape = histograms.shape[:-1]
+        histograms = histograms.reshape((-1, 256))
+        scale = 1. / np.maximum(histograms.sum(axis=-1), 1)
+        mu = (histograms * np.arange(256)).sum(axis=-1) * scale
+        epsilon = np.finfo(np.float32).eps
+
+        mu1 = np.zeros(histograms.shape[0])
+        q1 = np.zeros(histograms.shape[0])
+        max_sigma = np.zeros(histograms.shape[0])
+        max_val = np.zeros(histograms.shape[0], np.int64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for i in range(256):
+                p_i = histograms[:, i] * scale
+                mu1 = mu1 * q1
+                q1 = q1 + p_i
+                q2 = 1. - q1
+                valid = (np.minimum(q1, q2) >= epsilon) & (np.maximum(q1, q2) <= 1. - epsilon)
+                mu1 = np.where(valid, (mu1 + i * p_i) / q1, mu1)
+                mu2 = (mu - q1 * mu1) / q2
+                sigma = q1 * q2 * (mu2 - mu1) * (mu2 - mu1)
+                better = valid & (sigma > max_sigma)
+                max_sigma = np.where(better, sigma, max_sigma)
+                max_val = np.where(better, i, max_val)
+        return max_val.reshape(shape)
+
+    @staticmethod
+    def __last_blocks(length, block_size):
+        """
+        :return: along one axis, the block that is written last over each pixel
+        """
+        count = -(-length // block_size)
+        return np.minimum(np.arange(length) // block_size + 1, count - 1)
+
+    @staticmethod
+    def __block_mosaic(length, block_size, margin):
+        """
+        Lays out, along one axis, the part of each block that is not overwritten by a later block.
+        Each part is extended by `margin` pixels of its own block, and preceded by `margin` separator pixels.
+
+        :return: source pixel of each mosaic pixel (-1 for separators), block of each mosaic pixel,
+        and the mosaic pixel that holds the final value of each source pixel
+        """
+        count = -(-length // block_size)
+        blocks = range(1, count) if count > 1 else range(1)
+
+        sources, owners, outputs = [], [], []
+        offset = 0
+        for block in blocks:
+            start = max(0, (block - 1) * block_size)
+            end = length if block == count - 1 else block * block_size
+            extended_end = min(length, (block + 1) * block_size, end + margin)
+
+            source = np.concatenate((np.full(margin, -1), np.arange(start, extended_end)))
+            sources.append(source)
+            owners.append(np.full(source.shape[0], block))
+            outputs.append(np.arange(end - start) + offset + margin)
+            offset += source.shape[0]
+
+        return np.concatenate(sources), np.concatenate(owners), np.concatenate(outputs)
+
     @staticmethod
     def __get_block_index(image_shape, yx, block_size):
         """
@@ -91,7 +675,7 @@ class Capture:
         return np.meshgrid(y, x)
 
     @staticmethod
-    def __soften_binarization(image, mask, block_size):
+    def __soften_binarization(image, mask, block_size, vectorized=True, tiled=Tiles(), dst=None):
         def sigmoid(x, orig, rad):
             k = np.exp((x - orig) * 5 / rad)
             return k / (k + 1.)
@@ -132,12 +716,13 @@ class Capture:
             img_out[idx] = (255. * f).astype(np.uint8)
             return img_out
 
-        def combine_blocks(image, mask, block_size):
+        def combine_blocks(image, mask, block_size, dst=None):
             """
             Applies the combination routine on local blocks so that the scaling parameters of the Sigmoid function
             can be adjusted to the local setting.
             """
-            output_image = np.zeros_like(image)
+            output_image = np.empty_like(image) if dst is None else dst
+            output_image.fill(0)
             for row in range(0, image.shape[0], block_size):
                 for col in range(0, image.shape[1], block_size):
                     index = (row, col)
@@ -145,21 +730,347 @@ class Capture:
                     output_image[block_index] = apply_sigmoid(image[block_index], mask[block_index])
             return output_image
 
+        def combine_all_blocks(image, mask, block_size, dst=None):
+            """
+            Equivalent to `combine_blocks`, but computes the scaling parameters of every block at once
+            and applies the Sigmoid function to the whole image in a single pass.
+            Each pixel is scaled with the parameters of the last block written over it.
+            """
+            foreground = mask == 0
+            histograms = Capture.__block_histograms(image, block_size, foreground)
+            occupied = histograms > 0
+            lo = np.argmax(occupied, axis=-1).astype(np.float32)
+            hi = (255 - np.argmax(occupied[..., ::-1], axis=-1)).astype(np.float32)
+            r = (hi - lo).astype(np.float64) + 1e-5
+
+            threshold = Capture.__block_otsu(histograms)
+            above = occupied & (np.arange(256) > threshold[..., None])
+            bound_value = np.argmax(above, axis=-1)
+            bound_value = np.where(above.any(axis=-1), bound_value, threshold)
+            bound_value = (bound_value - lo).astype(np.float64) / r
+
+            rows = Capture.__last_blocks(image.shape[0], block_size)
+            cols = Capture.__last_blocks(image.shape[1], block_size)
+            index = np.ix_(rows, cols)
+            lo = lo[index][foreground]
+            r = r.astype(np.float32)[index][foreground]
+            orig = (bound_value + 0.05).astype(np.float32)[index][foreground]
+
+            v = image[foreground].astype(np.float32) - lo
+            f = v / r
+            f = sigmoid(f, orig, np.float32(0.2))
+
+            output_image = np.empty_like(image) if dst is None else dst
+            output_image.fill(0)
+            output_image[mask == 255] = 255
+            output_image[foreground] = (255. * f).astype(np.uint8)
+            return output_image
+
         def preprocess(image):
-            return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            return grayscale(image)
 
         def postprocess(image):
             # TODO
             return image
 
-        preprocessed = preprocess(image)
-        binarized = combine_blocks(preprocessed, mask, block_size)
-        postprocessed = postprocess(binarized)
+        combine = combine_all_blocks if vectorized else combine_blocks
+
+        preprocessed = tiled(preprocess, image)
+        binarized = tiled(lambda image, mask, dst=None: combine(image, mask, block_size, dst), preprocessed, mask,
+                          halo=block_size, out=dst)
+        postprocessed = tiled(postprocess, binarized)
         return postprocessed
 
-    def contours(self, predicate=lambda contour: True):
-        image = self.preprocess()[-1]
-        contours = cv2.findContours(image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        contours = imutils.grab_contours(contours)
-        contours = [contour for contour in contours if predicate(contour)]
+    def contours(self, predicate=lambda contour: True, stage: str = None):
+        """
+        :param stage: name of the stage whose output is searched for contours; defaults to the last stage
+        """
+        stage = self.output() if stage is None else stage
+        if stage not in self.__contours:
+            image = self.stage(stage)
+            contours = cv2.findContours(image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            self.__contours[stage] = imutils.grab_contours(contours)
+        contours = [contour for contour in self.__contours[stage] if predicate(contour)]
         return contours
+
+    def hierarchy(self, stage: str = None) -> Tuple[List[np.ndarray], np.ndarray]:
+        """
+        Finds all contours, including those nested inside other contours, in a single pass.
+
+        :param stage: name of the stage whose output is searched for contours; defaults to the last stage
+        :return: contours, and for each contour, the indices of its next and previous sibling, its first child,
+        and its parent; or -1 if there is none
+        """
+        stage = self.output() if stage is None else stage
+        if stage not in self.__hierarchies:
+            image = self.stage(stage)
+            contours, hierarchy = cv2.findContours(image, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)[-2:]
+            hierarchy = np.empty((0, 4), dtype=np.int32) if hierarchy is None else hierarchy.reshape((-1, 4))
+            self.__hierarchies[stage] = list(contours), hierarchy
+        return self.__hierarchies[stage]
+
+
+class Pyramid(Capture):
+
+    def __init__(self, image, width: int = WIDTH, margin: int = None, transform=lambda image: image, **options):
+        """
+        Finds rectangles at a low resolution, then refines each of their edges at the resolution of the captured image.
+        Only narrow strips along the edges of each rectangle are processed at full resolution,
+        so the cost of refinement grows with the number of rectangles rather than with the area of the image.
+
+        :param width: width of the image in which rectangles are first found;
+        narrower images lose thin or faint strokes, so it defaults to the width of a capture
+        :param margin: distance from a coarse edge within which the refined edge is searched;
+        defaults to twice the size of a pixel at the lower resolution
+        :param options: options of both the coarse and the full resolution captures
+        """
+        super().__init__(image, transform=transform, **options)
+        self.coarse = Capture(self.image, transform=lambda image: resize(image, width), **options)
+        self.ratio = self.coarse.image.shape[1] / self.image.shape[1]
+        self.margin = int(np.ceil(2 / self.ratio)) if margin is None else margin
+
+    def release(self):
+        super().release()
+        self.coarse.release()
+
+    def contours(self, predicate=lambda contour: True, stage: str = None, minimum_perimeter=100):
+        """
+        :param stage: if provided, contours are found in the output of this stage at full resolution instead
+        :param minimum_perimeter: minimum perimeter of rectangles at full resolution
+        :return: contours of the refined rectangles
+        """
+        if stage is not None:
+            return super().contours(predicate, stage)
+
+        contours = self.coarse.contours()
+        mask = are_rectangles(contours, minimum_perimeter=minimum_perimeter * self.ratio)
+        rectangles = [self.__refine(cv2.boundingRect(contour)) for contour, rectangle in zip(contours, mask) if rectangle]
+        return [rectangle for rectangle in rectangles if predicate(rectangle)]
+
+    def __refine(self, rectangle) -> np.ndarray:
+        height, width = self.image.shape[:2]
+        x, y, w, h = (int(round(value / self.ratio)) for value in rectangle)
+        left, top, right, bottom = x, y, min(width, x + w) - 1, min(height, y + h) - 1
+
+        def strip(start, end, position, length):
+            return slice(max(0, position - self.margin), min(length, position + self.margin + 1)), slice(start, end + 1)
+
+        top = self.__edge(strip(left, right, top, height), axis=0, default=top)
+        bottom = self.__edge(strip(left, right, bottom, height), axis=0, default=bottom)
+        left = self.__edge(strip(top, bottom, left, width)[::-1], axis=1, default=left)
+        right = self.__edge(strip(top, bottom, right, width)[::-1], axis=1, default=right)
+
+        points = np.array([[left, top], [right, top], [right, bottom], [left, bottom]])
+        return points.reshape((-1, 1, 2)).astype(np.int32)
+
+    def __edge(self, index, axis, default, contrast=16) -> int:
+        """
+        Locates the stroke crossing a strip of the captured image, along the given axis.
+        Strokes are found from how dark each row (or column) of the strip is on average,
+        which avoids binarizing the strip altogether.
+
+        :param contrast: minimum difference in average darkness between the stroke and the paper
+        :return: the coordinate of the center of the stroke, or `default` if there is none
+        """
+        strip = self.image[index]
+        if min(strip.shape[:2]) == 0:
+            return default
+
+        gray = grayscale(strip)
+        profile = 255 - gray.mean(axis=1 - axis)
+        profile -= profile.min()
+        peak = int(np.argmax(profile))
+        if profile[peak] < contrast:
+            return default
+
+        # The stroke spans the rows (or columns) around the peak that are at least half as dark
+        inked = profile >= profile[peak] / 2
+        start = peak - np.argmin(inked[peak::-1]) + 1 if not inked[:peak + 1].all() else 0
+        end = peak + np.argmin(inked[peak:]) - 1 if not inked[peak:].all() else len(profile) - 1
+        return index[axis].start + (start + end) // 2
+
+
+class Scan:
+
+    def __init__(self, image, tile_size: int = 512, reduction: int = None, preview=True, scale: float = 1.,
+                 **options):
+        """
+        Captures images too large to be held in memory, such as memory-mapped scans, one tile at a time.
+        Each tile is read a few rows at a time, reduced, and preprocessed on its own, along with enough of its
+        neighbours for its preprocessed output to match that of the whole image;
+        contours which cross tile boundaries are then merged.
+        Memory used while capturing depends on the tile size, rather than on the size of the image.
+        Only contours can be found from a scan; outputs of stages are not kept.
+
+        :param image: image, which may be a memory-mapped array (see `load`)
+        :param tile_size: width and height of the tiles the image is processed in, after reduction
+        :param reduction: factor by which the image is shrunk before being preprocessed;
+        defaults to the factor which brings the image down to about `WIDTH` pixels across
+        :param preview: whether to keep a reduced copy of the image, as `image`
+        :param scale: scale of the provided image relative to the original image, if it was already resized;
+        like that of `Capture`, the scale of the scan is only kept for mapping coordinates onto the original image
+        :param options: options of the capture of each tile
+        """
+        height, width = image.shape[:2]
+        self.source = image
+        self.reduction = max(1, int(round(width / WIDTH))) if reduction is None else reduction
+        self.scale = scale / self.reduction
+        self.options = options
+
+        block_size = Capture.BLOCK_SIZE
+        self.step = max(1, tile_size // block_size) * block_size
+        # Blocks reach into the neighbouring block on each side, and thinning a little further
+        self.halo = 3 * block_size
+        # Pixels left over by the reduction are dropped, so that each reduced pixel covers the same area
+        self.shape = height // self.reduction, width // self.reduction
+
+        self.image = np.empty(self.shape + image.shape[2:], image.dtype) if preview else None
+        self.__contours = None
+
+    @staticmethod
+    def buffer(name: str, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """
+        :return: array which an output called `name` can be written to
+        """
+        return np.empty(shape, dtype)
+
+    def tiles(self) -> Iterable[Tuple[int, int, int, int]]:
+        """
+        :return: top, left, bottom and right boundaries of each tile, in the reduced image
+        """
+        height, width = self.shape
+        for top in range(0, height, self.step):
+            for left in range(0, width, self.step):
+                yield top, left, min(height, top + self.step), min(width, left + self.step)
+
+    def contours(self, predicate=lambda contour: True):
+        if self.__contours is None:
+            self.__contours = self.__merge({tile: self.__tile_contours(*tile) for tile in self.tiles()})
+        return [contour for contour in self.__contours if predicate(contour)]
+
+    def __tile_contours(self, top, left, bottom, right):
+        """
+        :return: contours that lie within the tile, contours that cross one of its boundaries,
+        the pixels of each crossing contour within its bounding rectangle,
+        and for each boundary, the crossing contour each of its pixels belongs to, counting from 1
+        """
+        height, width = self.shape
+        y0, x0 = max(0, top - self.halo), max(0, left - self.halo)
+        y1, x1 = min(height, bottom + self.halo), min(width, right + self.halo)
+
+        tile = self.__read(y0, x0, y1, x1)
+        if self.image is not None:
+            self.image[top:bottom, left:right] = tile[top - y0:bottom - y0, left - x0:right - x0]
+
+        # The core is copied out of the arrays of the capture, which the next tile writes to once released
+        with Capture(tile, transform=lambda image: image, **{'retain': (), **self.options}) as capture:
+            core = capture.stage(capture.output())[top - y0:bottom - y0, left - x0:right - x0].copy()
+        contours = imutils.grab_contours(cv2.findContours(core, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE))
+
+        def crosses(contour):
+            x, y, w, h = cv2.boundingRect(contour)
+            return (x == 0 < left) or (y == 0 < top) or (x + w == right - left and right < width) or \
+                   (y + h == bottom - top and bottom < height)
+
+        inner = [contour for contour in contours if not crosses(contour)]
+        crossing = [contour for contour in contours if crosses(contour)]
+
+        labels = np.zeros(core.shape, np.int32)
+        for index in range(len(crossing)):
+            cv2.drawContours(labels, crossing, index, color=index + 1, thickness=cv2.FILLED)
+        labels[core == 0] = 0
+        boundaries = {'top': labels[0], 'bottom': labels[-1], 'left': labels[:, 0], 'right': labels[:, -1]}
+
+        inks = []
+        for index, contour in enumerate(crossing):
+            x, y, w, h = cv2.boundingRect(contour)
+            inks.append((labels[y:y + h, x:x + w] == index + 1).astype(np.uint8))
+
+        offset = np.array([left, top], dtype=np.int32)
+        return [contour + offset for contour in inner], [contour + offset for contour in crossing], inks, boundaries
+
+    def __read(self, top, left, bottom, right, rows=32) -> np.ndarray:
+        """
+        Reads part of the reduced image, `rows` reduced rows at a time.
+        """
+        reduction = self.reduction
+        if reduction == 1:
+            return np.ascontiguousarray(self.source[top:bottom, left:right])
+
+        tile = np.empty((bottom - top, right - left) + self.source.shape[2:], self.source.dtype)
+        for start in range(top, bottom, rows):
+            end = min(bottom, start + rows)
+            strip = self.source[start * reduction:end * reduction, left * reduction:right * reduction]
+            tile[start - top:end - top] = cv2.resize(strip, (right - left, end - start), interpolation=cv2.INTER_AREA)
+        return tile
+
+    @staticmethod
+    def __merge(tiles):
+        """
+        Joins contours which meet across tile boundaries, by outlining their pixels together.
+        Contours enclosed by a joined contour are dropped, as they would be if the image was captured whole.
+        """
+        inner = [contour for contours, _, _, _ in tiles.values() for contour in contours]
+        crossing = [contour for _, contours, _, _ in tiles.values() for contour in contours]
+        inks = [ink for _, _, inks, _ in tiles.values() for ink in inks]
+
+        offsets, offset = {}, 0
+        for tile, (_, contours, _, _) in tiles.items():
+            offsets[tile] = offset
+            offset += len(contours)
+
+        parents = list(range(len(crossing)))
+
+        def find(index):
+            while parents[index] != index:
+                parents[index] = parents[parents[index]]
+                index = parents[index]
+            return index
+
+        def join(first, first_boundary, second, second_boundary):
+            first_labels = tiles[first][3][first_boundary]
+            second_labels = tiles[second][3][second_boundary]
+            # Pixels are connected to their three nearest neighbours across the boundary
+            for shift in (-1, 0, 1):
+                a = first_labels[max(0, shift):len(first_labels) + min(0, shift)]
+                b = second_labels[max(0, -shift):len(second_labels) + min(0, -shift)]
+                touching = (a > 0) & (b > 0)
+                for i, j in set(zip(a[touching], b[touching])):
+                    parents[find(offsets[first] + i - 1)] = find(offsets[second] + j - 1)
+
+        for tile in tiles:
+            top, left, bottom, right = tile
+            for neighbour in tiles:
+                if neighbour[:3:2] == (top, bottom) and neighbour[1] == right:
+                    join(tile, 'right', neighbour, 'left')
+                if neighbour[1::2] == (left, right) and neighbour[0] == bottom:
+                    join(tile, 'bottom', neighbour, 'top')
+
+        def outline(group):
+            """
+            :return: outer contours of the pixels of the grouped contours, drawn together
+            """
+            rectangles = [cv2.boundingRect(crossing[index]) for index in group]
+            x0, y0 = min(x for x, _, _, _ in rectangles), min(y for _, y, _, _ in rectangles)
+            x1, y1 = max(x + w for x, _, w, _ in rectangles), max(y + h for _, y, _, h in rectangles)
+
+            mask = np.zeros((y1 - y0, x1 - x0), np.uint8)
+            for index, (x, y, w, h) in zip(group, rectangles):
+                mask[y - y0:y - y0 + h, x - x0:x - x0 + w] |= inks[index]
+            contours = imutils.grab_contours(cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE))
+            return [contour + np.array([x0, y0], dtype=np.int32) for contour in contours]
+
+        groups = {}
+        for index in range(len(crossing)):
+            groups.setdefault(find(index), []).append(index)
+        merged = [contour for group in groups.values()
+                  for contour in ([crossing[group[0]]] if len(group) == 1 else outline(group))]
+
+        def enclosed(contour):
+            x, y, w, h = cv2.boundingRect(contour)
+            corners = [(x, y), (x + w - 1, y), (x + w - 1, y + h - 1), (x, y + h - 1)]
+            return any(other is not contour and
+                       all(cv2.pointPolygonTest(other, (float(cx), float(cy)), False) > 0 for cx, cy in corners)
+                       for other in merged)
+
+        return [contour for contour in inner + merged if not enclosed(contour)]
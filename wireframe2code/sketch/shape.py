@@ -1,3 +1,4 @@
+import numpy as np
 from cv2 import cv2
 
 
@@ -11,7 +12,7 @@ def centroid(contour):
     return x, y
 
 
-def is_rectangle(contour):
+def is_rectangle(contour, perimeter=None):
     """
     Determines if the provided contour is a quadrangle.
     A contour is considered a quadrangle when:
@@ -20,9 +21,11 @@ def is_rectangle(contour):
     - Its area occupies a significant percentage of the minimum fitting rectangle for the contour.
       This percentage is specified through `minimum_area_ratio`.
 
+    :param perimeter: perimeter of the contour, if already known
     :return: boolean value indicating whether or not the provided contour is a quadrangle
     """
-    perimeter = cv2.arcLength(contour, True)
+    if perimeter is None:
+        perimeter = cv2.arcLength(contour, True)
     epsilon = 0.04 * perimeter
     approximate_curves = cv2.approxPolyDP(contour, epsilon, True)
     if len(approximate_curves) == 4:
@@ -30,3 +33,83 @@ def is_rectangle(contour):
         ratio = abs(cv2.contourArea(contour)) / (rectangle[1][0] * rectangle[1][1])
         return ratio >= 0.85
     return False
+
+
+def are_rectangles(contours, minimum_perimeter=0, minimum_area=0, maximum_aspect_ratio=None):
+    """
+    Determines which of the provided contours are quadrangles, as `is_rectangle` does.
+    All contours are first screened at once by their number of points, perimeter, area and bounding rectangle,
+    so that polygons are only approximated for the contours that remain.
+    The perimeter of each remaining contour is computed once, and shared with `is_rectangle`.
+
+    :param minimum_perimeter: minimum perimeter of a quadrangle
+    :param minimum_area: minimum area of the bounding rectangle of a quadrangle
+    :param maximum_aspect_ratio: maximum ratio of the longer side of the minimum fitting rectangle of a quadrangle
+    to its shorter side
+    :return: boolean array indicating whether or not each contour is a quadrangle
+    """
+    mask = np.zeros(len(contours), dtype=bool)
+    if len(contours) == 0:
+        return mask
+
+    lengths = np.fromiter(map(len, contours), dtype=np.int64, count=len(contours))
+    starts = np.cumsum(lengths) - lengths
+    # Products of coordinates overflow 32 bits once coordinates pass about 46k, as in full-resolution scans
+    points = np.concatenate(contours)[:, 0, :].astype(np.int64)
+    x, y = points.T
+
+    # Each point is joined to the point before it, and the first point to the last point of the same contour
+    previous = np.roll(points, 1, axis=0)
+    previous[starts] = points[starts + lengths - 1]
+    previous_x, previous_y = previous.T
+
+    # Segment lengths are computed in single precision, like `cv2.arcLength` does
+    delta = (points - previous).astype(np.float32)
+    delta *= delta
+    perimeters = np.add.reduceat(np.sqrt(delta[:, 0] + delta[:, 1]), starts, dtype=np.float64)
+    areas = np.abs(np.add.reduceat(previous_x * y - x * previous_y, starts, dtype=np.int64)) / 2
+    width, height = (np.maximum.reduceat(points, starts) - np.minimum.reduceat(points, starts)).T
+
+    # Estimated perimeters are summed in a different order than `cv2.arcLength`, hence the tolerance
+    candidates = (lengths >= 4) & (areas > 0) \
+        & (perimeters >= minimum_perimeter * (1 - 1e-6)) \
+        & ((width + 1) * (height + 1) >= minimum_area)
+    if maximum_aspect_ratio is not None:
+        # Rotating a rectangle with sides a and b grows its bounding rectangle by at most (a / b + b / a) / 2 times
+        # its area, so a quadrangle must fill at least this much of its bounding rectangle
+        growth = 1 + (maximum_aspect_ratio + 1 / maximum_aspect_ratio) / 2
+        candidates &= areas >= 0.85 * width * height / growth
+
+    for index in np.flatnonzero(candidates):
+        contour = contours[index]
+        perimeter = cv2.arcLength(contour, True)
+        mask[index] = perimeter >= minimum_perimeter and is_rectangle(contour, perimeter)
+        if mask[index] and maximum_aspect_ratio is not None:
+            sides = cv2.minAreaRect(contour)[1]
+            mask[index] = max(sides) <= maximum_aspect_ratio * min(sides)
+
+    return mask
+
+
+def enclosed_rectangles(image, minimum_perimeter=0, minimum_fill_ratio=0.85):
+    """
+    Finds the regions enclosed by strokes that fill most of their bounding rectangle.
+    All regions are labelled and measured in a single pass, instead of one contour at a time.
+    Regions touching the border of the image are not enclosed, and are ignored.
+
+    :param image: binary image, where strokes are non-zero
+    :param minimum_perimeter: minimum perimeter of the bounding rectangle of a region
+    :param minimum_fill_ratio: minimum ratio of the area of a region to the area of its bounding rectangle
+    :return: array of rows (x, y, width, height), bounding each enclosed region along with its surrounding stroke
+    """
+    background = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY_INV)[1]
+    # The default algorithm for 4-way connectivity is not reliable across OpenCV versions
+    _, _, stats, _ = cv2.connectedComponentsWithStatsWithAlgorithm(background, 4, cv2.CV_32S, cv2.CCL_WU)
+    x, y, width, height, area = stats.T
+
+    enclosed = (x > 0) & (y > 0) & (x + width < image.shape[1]) & (y + height < image.shape[0])
+    filled = area >= minimum_fill_ratio * width * height
+    long = 2 * (width + height) >= minimum_perimeter
+
+    rectangles = stats[enclosed & filled & long, :4]
+    return rectangles + np.array([-1, -1, 2, 2])
@@ -0,0 +1,140 @@
+from collections import deque
+from itertools import count
+from typing import Dict
+from typing import Iterable
+from typing import List
+
+import numpy as np
+
+from sketch.wireframe import Container
+from sketch.wireframe import ContainerArray
+from sketch.wireframe import Inference
+from sketch.wireframe import PlaceholderWidget
+from sketch.wireframe import Wireframe
+
+
+class Track:
+
+    def __init__(self, identity: int, container: Container, window: int):
+        """
+        A placeholder followed across frames.
+
+        :param identity: number identifying the placeholder for as long as it is followed
+        :param window: number of recent detections the placeholder is placed from
+        """
+        self.identity = identity
+        self.detections = deque([container], maxlen=window)
+        # Median of the recent detections, which is not thrown off by a single misplaced detection
+        self.container = container
+        self.hits = 1
+        self.misses = 0
+        # Placeholder shown for this track, once it was detected often enough
+        self.placeholder = None
+
+    def detect(self, container: Container):
+        self.detections.append(container)
+        self.hits += 1
+        self.misses = 0
+
+        detections = [(detection.x, detection.y, detection.width, detection.height) for detection in self.detections]
+        self.container = Container(*(int(value) for value in np.median(detections, axis=0)))
+
+    def visible(self) -> bool:
+        return self.placeholder is not None
+
+
+class Tracker:
+
+    def __init__(self, threshold: float = 0.5, window: int = 5, appear: int = 2, disappear: int = 3,
+                 stability: float = 0.9, inference: Inference = Inference.GAPS):
+        """
+        Follows placeholders across the frames of a camera, so that each placeholder keeps its identity, and
+        the layout is inferred again only once placeholders are added, removed or moved.
+        Nested placeholders are not followed.
+
+        :param threshold: smallest intersection over union at which a detected placeholder matches a track
+        :param window: number of recent detections each placeholder is placed from
+        :param appear: number of frames in a row a placeholder must be detected in, before it is shown
+        :param disappear: number of frames in a row a shown placeholder must be missing from, before it is removed
+        :param stability: shown placeholders stay in place until their intersection over union with their
+        recent detections drops below this value
+        """
+        self.threshold = threshold
+        self.window = window
+        self.appear = appear
+        self.disappear = disappear
+        self.stability = stability
+
+        self.tracks: List[Track] = []
+        self.wireframe = Wireframe.of([], inference)
+        self.__identities = count()
+
+    def update(self, placeholders: Iterable[PlaceholderWidget]) -> bool:
+        """
+        Matches the placeholders detected in a frame with the tracks of earlier frames.
+
+        :return: whether the placeholders of the tracked wireframe changed
+        """
+        containers = [placeholder.container for placeholder in placeholders]
+        matches = self.__match(containers)
+
+        matched = set(matches.values())
+        for index, track in enumerate(self.tracks):
+            if index not in matched:
+                track.misses += 1
+        for detection, index in matches.items():
+            self.tracks[index].detect(containers[detection])
+
+        # Tracks that were never shown are dropped as soon as they are missed, while shown tracks linger
+        self.tracks = [track for track in self.tracks
+                       if track.misses == 0 or (track.visible() and track.misses < self.disappear)]
+        self.tracks += [Track(next(self.__identities), container, self.window)
+                        for index, container in enumerate(containers) if index not in matches]
+
+        for track in self.tracks:
+            if track.misses > 0:
+                continue
+            if track.visible():
+                if self.__iou(track.placeholder.container, track.container) < self.stability:
+                    track.placeholder = PlaceholderWidget(None, container=track.container)
+            elif track.hits >= self.appear:
+                track.placeholder = PlaceholderWidget(None, container=track.container)
+
+        placeholders = {track.placeholder for track in self.tracks if track.visible()}
+        if placeholders == self.wireframe.placeholders:
+            return False
+        # The layout is inferred again on its next use, since the placeholders differ
+        self.wireframe.placeholders = placeholders
+        return True
+
+    def __match(self, containers: List[Container]) -> Dict[int, int]:
+        """
+        Greedily pairs detected containers with tracks, from the pair that overlaps the most.
+
+        :return: index of the matching track, by index of the detected container
+        """
+        if len(containers) == 0 or len(self.tracks) == 0:
+            return {}
+
+        detected = ContainerArray.of(containers)
+        tracked = ContainerArray.of(track.container for track in self.tracks)
+        iou = detected.iou(tracked)
+
+        matches = {}
+        taken = set()
+        for flat in np.argsort(iou, axis=None, kind='stable')[::-1]:
+            detection, track = (int(index) for index in np.unravel_index(flat, iou.shape))
+            if iou[detection, track] < self.threshold:
+                break
+            if detection in matches or track in taken:
+                continue
+            matches[detection] = track
+            taken.add(track)
+        return matches
+
+    @staticmethod
+    def __iou(container: Container, other: Container) -> float:
+        intersection = container.intersection(other)
+        intersection_area = intersection.width * intersection.height
+        union_area = container.width * container.height + other.width * other.height - intersection_area
+        return intersection_area / union_area if union_area > 0 else 0.
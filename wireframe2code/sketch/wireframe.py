@@ -1,9 +1,15 @@
 from __future__ import annotations
 
 import logging
+from bisect import bisect_left
+from bisect import bisect_right
 from enum import Enum
 from typing import Callable
+from typing import Dict
+from typing import FrozenSet
+from typing import Iterable
 from typing import List
+from typing import Optional
 from typing import Set
 from typing import Tuple
 from typing import Union
@@ -13,12 +19,15 @@ from cv2 import cv2
 from more_itertools import pairwise
 
 from sketch.capture import Capture
-from sketch.shape import is_rectangle
+from sketch.shape import are_rectangles
+from sketch.shape import enclosed_rectangles
 from web.element import Tag
 
 
 class Container:
 
+    __slots__ = ('x', 'y', 'width', 'height')
+
     def __init__(self, x: int, y: int, width: int, height: int):
         self.x = x
         self.y = y
@@ -115,6 +124,125 @@ class Container:
         return hash(self.__key())
 
 
+class ContainerArray:
+
+    def __init__(self, x, y, width, height):
+        """
+        Containers stored as columns of coordinates, for operating on many containers at once.
+        Elementwise operations accept either a single container, or an array of as many containers.
+        """
+        columns = x, y, width, height
+        self.x, self.y, self.width, self.height = (np.asarray(column, dtype=np.int32) for column in columns)
+
+    @classmethod
+    def of(cls, containers: Iterable[Container]) -> ContainerArray:
+        columns = np.array([(c.x, c.y, c.width, c.height) for c in containers], dtype=np.int32).reshape((-1, 4))
+        return cls(*columns.T)
+
+    @classmethod
+    def bounding(cls, contours: Iterable[np.ndarray]) -> ContainerArray:
+        """
+        :return: bounding containers of the provided contours
+        """
+        columns = np.array([cv2.boundingRect(contour) for contour in contours], dtype=np.int32).reshape((-1, 4))
+        return cls(*columns.T)
+
+    @classmethod
+    def grid(cls, container: Container, rows: int, columns: int) -> ContainerArray:
+        """
+        :return: containers of equal size dividing the provided container, row by row
+        """
+        height = int(container.height / rows)
+        width = int(container.width / columns)
+        y, x = np.divmod(np.arange(rows * columns), columns)
+        return cls(container.x + x * width, container.y + y * height,
+                   np.full(rows * columns, width), np.full(rows * columns, height))
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, index) -> Union[Container, ContainerArray]:
+        if np.isscalar(index):
+            return Container(int(self.x[index]), int(self.y[index]), int(self.width[index]), int(self.height[index]))
+        return ContainerArray(self.x[index], self.y[index], self.width[index], self.height[index])
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+    def __edges(self):
+        x, y = self.x.astype(np.int64), self.y.astype(np.int64)
+        return x, y, x + self.width, y + self.height
+
+    @staticmethod
+    def __other_edges(other: Union[Container, ContainerArray]):
+        if isinstance(other, ContainerArray):
+            return other.__edges()
+        return other.x, other.y, other.x + other.width, other.y + other.height
+
+    def area(self) -> np.ndarray:
+        return self.width.astype(np.int64) * self.height
+
+    def center(self) -> np.ndarray:
+        """
+        :return: center of each container, as a row of x and y
+        """
+        x = self.x + self.width / 2
+        y = self.y + self.height / 2
+        return np.column_stack((x, y)).astype(np.int64)
+
+    def intersection(self, other: Union[Container, ContainerArray]) -> ContainerArray:
+        """
+        Elementwise equivalent of `Container.intersection`.
+        """
+        x0, y0, x1, y1 = self.__edges()
+        ox0, oy0, ox1, oy1 = self.__other_edges(other)
+        x = np.maximum(x0, ox0)
+        y = np.maximum(y0, oy0)
+        w = np.minimum(x1, ox1) - x
+        h = np.minimum(y1, oy1) - y
+        empty = (w < 0) | (h < 0)
+        return ContainerArray(*(np.where(empty, 0, column) for column in (x, y, w, h)))
+
+    def union(self, other: Union[Container, ContainerArray]) -> ContainerArray:
+        """
+        Elementwise equivalent of `Container.union`.
+        """
+        x0, y0, x1, y1 = self.__edges()
+        ox0, oy0, ox1, oy1 = self.__other_edges(other)
+        x = np.minimum(x0, ox0)
+        y = np.minimum(y0, oy0)
+        return ContainerArray(x, y, np.maximum(x1, ox1) - x, np.maximum(y1, oy1) - y)
+
+    def intersection_areas(self, other: ContainerArray) -> np.ndarray:
+        """
+        :return: matrix of the intersection area of each of these containers (row) with each other container (column)
+        """
+        x0, y0, x1, y1 = (edge[:, None] for edge in self.__edges())
+        ox0, oy0, ox1, oy1 = other.__edges()
+        w = np.maximum(np.minimum(x1, ox1) - np.maximum(x0, ox0), 0)
+        h = np.maximum(np.minimum(y1, oy1) - np.maximum(y0, oy0), 0)
+        return w * h
+
+    def iou(self, other: ContainerArray) -> np.ndarray:
+        """
+        :return: matrix of the intersection over union of each of these containers (row) with each other container
+        (column)
+        """
+        intersections = self.intersection_areas(other)
+        unions = self.area()[:, None] + other.area() - intersections
+        return np.divide(intersections, unions, out=np.zeros(intersections.shape), where=unions > 0)
+
+    def bounds(self) -> Container:
+        """
+        :return: smallest container enclosing all containers
+        """
+        if len(self) == 0:
+            return Container.empty()
+        x0, y0, x1, y1 = self.__edges()
+        x, y = int(x0.min()), int(y0.min())
+        return Container(x, y, int(x1.max()) - x, int(y1.max()) - y)
+
+
 class Location:
 
     def __init__(self, start: Tuple[int, int], end: Tuple[int, int] = None):
@@ -147,11 +275,35 @@ class Location:
 
 class Widget:
 
-    def __init__(self, contour: np.ndarray, tag: Tag, location: Location):
-        self.contour = contour
-        self.container = Container(*cv2.boundingRect(contour))
+    def __init__(self, contour: Optional[np.ndarray], tag: Tag, location: Location, container: Container = None,
+                 filler: bool = False):
+        """
+        :param contour: outline of the widget; if absent, the widget is the rectangle of `container`,
+        whose outline is only computed if requested
+        :param container: bounding container of the widget; computed from `contour` if absent
+        :param filler: whether the widget only fills a cell of the grid that no detected element occupies
+        """
+        if contour is None and container is None:
+            raise ValueError("Either 'contour' or 'container' must be provided")
+
+        self.__contour = contour
+        self.container = Container(*cv2.boundingRect(contour)) if container is None else container
         self.tag = tag
         self.location = location
+        self.filler = filler
+
+    @property
+    def contour(self) -> np.ndarray:
+        if self.__contour is None:
+            return self.container.contour()
+        return self.__contour
+
+    @property
+    def outlined(self) -> bool:
+        """
+        :return: whether the widget has an outline of its own, rather than the rectangle of its container
+        """
+        return self.__contour is not None
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
@@ -175,13 +327,14 @@ class Widget:
         return ending_row - starting_row + 1
 
     def empty(self):
-        return np.array_equal(self.container.contour(), self.contour)
+        return self.filler
 
 
 class PlaceholderWidget(Widget):
 
-    def __init__(self, contour: np.ndarray, location=Location.unknown()):
-        super().__init__(contour, Tag.DIV, location)
+    def __init__(self, contour: Optional[np.ndarray], location=Location.unknown(), container: Container = None,
+                 filler: bool = False):
+        super().__init__(contour, Tag.DIV, location, container, filler)
 
     def occupies(self, container: Container, threshold=1):
         if not 1 > threshold > 0:
@@ -201,7 +354,7 @@ class RowPlaceholderWidget(PlaceholderWidget):
     def __init__(self, widget: PlaceholderWidget):
         container = widget.container
         container = Container(0, container.y, container.width, container.height)
-        super().__init__(container.contour())
+        super().__init__(None, container=container)
 
     def size(self):
         return self.container.height
@@ -232,7 +385,7 @@ class ColumnPlaceholderWidget(PlaceholderWidget):
     def __init__(self, widget: PlaceholderWidget):
         container = widget.container
         container = Container(container.x, 0, container.width, container.height)
-        super().__init__(container.contour())
+        super().__init__(None, container=container)
 
     def size(self):
         return self.container.width
@@ -258,36 +411,217 @@ class ColumnPlaceholderWidget(PlaceholderWidget):
         return intersection.width
 
 
+class Layout:
+
+    def __init__(self, container: Container, shape: Tuple[int, int], grids: Tuple[Container, ...],
+                 widgets: FrozenSet[Widget], children: Dict[Container, Layout] = None):
+        """
+        Grid layout inferred from the placeholders of a wireframe.
+
+        :param container: bounding container of all placeholders
+        :param shape: number of rows and columns of the grid
+        :param grids: cells of the grid, row by row
+        :param widgets: widgets placed on the grid, including placeholders for unoccupied cells
+        :param children: layouts nested within widgets, by the container of the widget
+        """
+        self.container = container
+        self.shape = shape
+        self.grids = grids
+        self.widgets = widgets
+        self.children = {} if children is None else children
+
+    def child(self, widget: Widget) -> Optional[Layout]:
+        """
+        :return: the layout nested within the provided widget, if any
+        """
+        return self.children.get(widget.container)
+
+
 class Direction(Enum):
 
     ROW = RowPlaceholderWidget
     COLUMN = ColumnPlaceholderWidget
 
 
-class Wireframe:
+class Detector(Enum):
+
+    # Approximates each contour with a polygon
+    CONTOURS = 'contours'
+    # Measures all regions enclosed by strokes at once; finds boxes with noisy strokes, but is slower than contours
+    # and ignores nested rectangles
+    COMPONENTS = 'components'
 
-    def __init__(self, capture: Capture):
-        self.source = capture.image.copy()
 
-        # TODO: Get predicate from configuration
-        contours = capture.contours(predicate=lambda contour: cv2.arcLength(contour, True) >= 100)
+class Inference(Enum):
 
-        # TODO: Get epsilon constant and minimum contour-area-to-minimum-rectangle-area ratio from configuration
-        rectangles = [contour for contour in contours if is_rectangle(contour)]
+    # Counts the gaps between the smallest widgets along each axis; quadratic in the number of widgets
+    GAPS = 'gaps'
+    # Counts where widgets start and end along each axis, from histograms; linear in the number of widgets
+    PROFILES = 'profiles'
+
+
+class Wireframe:
+
+    def __init__(self, capture: Capture, detector: Detector = Detector.CONTOURS, inference: Inference = Inference.GAPS,
+                 nested: bool = False, lean: bool = False):
+        """
+        :param detector: strategy used to find rectangles in the capture
+        :param inference: strategy used to count the rows and columns of the grid
+        :param nested: whether rectangles drawn inside other rectangles are laid out in grids of their own;
+        otherwise, only the outermost rectangles are found
+        :param lean: whether only what is needed to write HTML is kept; the captured image is not copied for previews,
+        and placeholders keep their containers rather than their contours
+        """
+        # Scans only find contours tile by tile, without the hierarchy or the stages of the whole image
+        if (nested or detector is Detector.COMPONENTS) and not isinstance(capture, Capture):
+            raise ValueError("Nested layouts and connected components can only be found from a whole capture")
+
+        source = None
+        if capture.image is not None and not lean:
+            source = capture.buffer('source', capture.image.shape, capture.image.dtype)
+            np.copyto(source, capture.image)
+        children = {}
+
+        if nested:
+            if detector is not Detector.CONTOURS:
+                raise ValueError("Nested layouts can only be found from contours")
+            rectangles, children = self.__nest(*capture.hierarchy(), inference, lean)
+        elif detector is Detector.COMPONENTS:
+            image = capture.stage(capture.output())
+            # Regions are exact rectangles, so their outlines are left to be computed when needed
+            rectangles = [PlaceholderWidget(None, container=Container(*map(int, rectangle)))
+                          for rectangle in enclosed_rectangles(image, minimum_perimeter=100)]
+        else:
+            contours = capture.contours()
+
+            # TODO: Get minimum perimeter from configuration
+            # TODO: Get epsilon constant and minimum contour-area-to-minimum-rectangle-area ratio from configuration
+            mask = are_rectangles(contours, minimum_perimeter=100)
+            rectangles = [self.__placeholder(contour, lean) for contour, rectangle in zip(contours, mask) if rectangle]
         logging.debug(f"Found '{len(rectangles)}' rectangles")
 
+        self.__setup(rectangles, inference, source, children)
+
+    @classmethod
+    def of(cls, placeholders: Iterable[PlaceholderWidget], inference: Inference = Inference.GAPS,
+           children: Dict[Container, Wireframe] = None) -> Wireframe:
+        """
+        Creates a wireframe from placeholders that were already found, such as those nested within a placeholder.
+
+        :param children: wireframes nested within placeholders, by the container of the placeholder
+        """
+        wireframe = cls.__new__(cls)
+        wireframe.__setup(placeholders, inference, None, {} if children is None else children)
+        return wireframe
+
+    def __setup(self, placeholders: Iterable[PlaceholderWidget], inference: Inference, source: Optional[np.ndarray],
+                children: Dict[Container, Wireframe]):
+        self.inference = inference
+        self.source = source
+        self.children = children
+
         # TODO: Add other supported elements
-        self.placeholders = {PlaceholderWidget(rectangle) for rectangle in rectangles}
+        self.placeholders = set(placeholders)
         logging.debug(f"Found '{len(self.placeholders)}' widgets")
 
+        self.__layout = None
+        self.__snapshot = None
+
+    @staticmethod
+    def __placeholder(contour: np.ndarray, lean: bool = False) -> PlaceholderWidget:
+        if lean:
+            return PlaceholderWidget(None, container=Container(*cv2.boundingRect(contour)))
+        return PlaceholderWidget(contour)
+
+    @staticmethod
+    def __nest(contours: List[np.ndarray], hierarchy: np.ndarray, inference: Inference, lean: bool = False) \
+            -> Tuple[List[PlaceholderWidget], Dict[Container, Wireframe]]:
+        """
+        Builds a tree of the rectangles among the provided contours, where each rectangle is the child of
+        the smallest rectangle it is drawn in.
+
+        :param hierarchy: next sibling, previous sibling, first child and parent of each contour
+        :return: the outermost placeholders, and the wireframes nested within placeholders
+        """
+        count = len(contours)
+        parents = hierarchy[:, 3] if count > 0 else np.empty(0, dtype=np.int32)
+
+        # Contours alternate between outer borders of strokes and borders of the holes within them
+        depths = np.full(count, -1)
+        for index in range(count):
+            chain = []
+            while index != -1 and depths[index] == -1:
+                chain.append(index)
+                index = parents[index]
+            depth = -1 if index == -1 else depths[index]
+            for index in reversed(chain):
+                depth += 1
+                depths[index] = depth
+
+        outer = np.flatnonzero(depths % 2 == 0)
+        rectangles = np.zeros(count, dtype=bool)
+        rectangles[outer] = are_rectangles([contours[index] for index in outer], minimum_perimeter=100)
+
+        # Contours are visited from the outside in, so the nearest rectangle around each parent is already known
+        ancestors = np.full(count, -1)
+        for index in np.argsort(depths, kind='stable'):
+            parent = parents[index]
+            if parent != -1:
+                ancestors[index] = parent if rectangles[parent] else ancestors[parent]
+
+        placeholders = {index: Wireframe.__placeholder(contours[index], lean) for index in np.flatnonzero(rectangles)}
+        members = {}
+        for index in placeholders:
+            members.setdefault(ancestors[index], []).append(index)
+
+        def build(index) -> Wireframe:
+            children = {placeholders[child].container: build(child) for child in members[index] if child in members}
+            return Wireframe.of([placeholders[child] for child in members[index]], inference, children)
+
+        roots = members.get(-1, [])
+        return [placeholders[index] for index in roots], \
+               {placeholders[index].container: build(index) for index in roots if index in members}
+
+    def layout(self) -> Layout:
+        """
+        Infers the layout of the placeholders on first use, and again only once the placeholders change.
+        """
+        snapshot = frozenset(self.placeholders)
+        if self.__layout is None or snapshot != self.__snapshot:
+            self.__snapshot = snapshot
+            self.__layout = self.__analyze()
+        return self.__layout
+
+    def invalidate(self):
+        """
+        Discards the inferred layout, e.g. after modifying the container of a placeholder in place.
+        """
+        self.__layout = None
+        for child in self.children.values():
+            child.invalidate()
+
+    def __analyze(self) -> Layout:
+        placeholders = list(self.placeholders)
+        containers = ContainerArray.of(placeholder.container for placeholder in placeholders)
+
+        container = containers.bounds()
+        if self.inference is Inference.PROFILES:
+            shape = self.__profile_count(containers, Direction.ROW), self.__profile_count(containers, Direction.COLUMN)
+        else:
+            shape = self.__reference_count(Direction.ROW), self.__reference_count(Direction.COLUMN)
+        grids = self.__grids(container, shape)
+        widgets = self.__widgets(placeholders, containers, shape, grids)
+        children = {container: child.layout() for container, child in self.children.items()}
+        return Layout(container, shape, tuple(grids), frozenset(widgets), children)
+
     def shape(self):
-        return self.row_count(), self.column_count()
+        return self.layout().shape
 
     def row_count(self) -> int:
-        return self.__reference_count(Direction.ROW)
+        return self.layout().shape[0]
 
     def column_count(self) -> int:
-        return self.__reference_count(Direction.COLUMN)
+        return self.layout().shape[1]
 
     def __reference_count(self, direction: Direction) -> int:
         widgets = self.__reference_widgets(direction)
@@ -314,6 +648,51 @@ class Wireframe:
 
         return len(widgets) + missing
 
+    @staticmethod
+    def __profile_count(containers: ContainerArray, direction: Direction) -> int:
+        """
+        Counts rows or columns from where placeholders start and end along the axis of the provided direction.
+        Each cluster of starting edges begins a row (or column); each empty stretch between placeholders
+        holds as many missing rows as fit in it.
+        """
+        if len(containers) == 0:
+            return 0
+
+        if direction is Direction.ROW:
+            starts, sizes = containers.y.astype(np.int64), containers.height.astype(np.int64)
+        else:
+            starts, sizes = containers.x.astype(np.int64), containers.width.astype(np.int64)
+        starts = starts - starts.min()
+        ends = starts + sizes
+        length = int(ends.max()) + 1
+
+        # Edges closer than a quarter of the smallest placeholder are considered the same
+        tolerance = max(1, int(sizes.min()) // 4)
+
+        def lines(edges):
+            histogram = np.bincount(edges, minlength=length)
+            window = np.concatenate(([0], np.cumsum(histogram)))
+            indices = np.arange(length)
+            near = window[np.minimum(indices + tolerance + 1, length)] - window[np.maximum(indices - tolerance, 0)]
+            return runs(near > 0)
+
+        def runs(mask):
+            """
+            :return: start and end of each run of true values
+            """
+            changes = np.flatnonzero(np.diff(np.concatenate(([False], mask, [False])).astype(np.int8)))
+            return changes[0::2], changes[1::2]
+
+        starting_lines, _ = lines(starts)
+        count = len(starting_lines)
+        pitch = np.median(np.diff(starting_lines)) if count > 1 else sizes.min()
+
+        coverage = np.cumsum(np.bincount(starts, minlength=length) - np.bincount(ends, minlength=length))
+        empty_starts, empty_ends = runs(coverage[:-1] == 0)
+        count += int(np.round((empty_ends - empty_starts) / pitch).sum())
+
+        return count
+
     def __reference_widgets(self, direction: Direction, threshold: float = 0.55)\
             -> Set[Union[RowPlaceholderWidget, ColumnPlaceholderWidget]]:
         """
@@ -333,19 +712,34 @@ class Wireframe:
             return 1 >= intersection_ratio_r1 >= threshold and 1 >= intersection_ratio_r2 >= threshold
 
         def filter(widgets: List[direction.value], predicate: Callable[[direction.value, direction.value], bool]):
-            unfiltered = widgets[:]
-            widgets = []
-
-            while len(unfiltered) > 0:
-                reference = unfiltered[0]
-
-                others = unfiltered[:]
-                others.remove(reference)
-
-                unfiltered = [other for other in others if not predicate(other, reference)]
-                widgets.append(reference)
-
-            return widgets
+            """
+            Keeps each widget, in order, unless it matches the predicate with a widget kept before it.
+            Both predicates require more than half of the kept widget to be overlapped when the threshold is
+            above one half, in which case only kept widgets whose midpoint lies within the widget are checked.
+            """
+            kept = []
+            # Midpoints of kept widgets are doubled to keep them whole, and sorted along with their widgets
+            midpoints = []
+            references = []
+
+            for widget in widgets:
+                start = widget.coordinate()
+                size = widget.size()
+
+                candidates = references
+                if threshold > 0.5:
+                    low = bisect_left(midpoints, 2 * start)
+                    high = bisect_right(midpoints, 2 * (start + size))
+                    candidates = references[low:high]
+                if any(predicate(widget, reference) for reference in candidates):
+                    continue
+
+                index = bisect_right(midpoints, 2 * start + size)
+                midpoints.insert(index, 2 * start + size)
+                references.insert(index, widget)
+                kept.append(widget)
+
+            return kept
 
         if len(self.placeholders) == 0:
             return set()
@@ -360,6 +754,20 @@ class Wireframe:
         return {copies_to_widgets[copy] for copy in copies}
 
     def widgets(self) -> Set[Widget]:
+        return set(self.layout().widgets)
+
+    def grids(self) -> List[Container]:
+        return list(self.layout().grids)
+
+    def container(self) -> Container:
+        return self.layout().container
+
+    @staticmethod
+    def __widgets(placeholders: List[PlaceholderWidget], containers: ContainerArray, shape: Tuple[int, int],
+                  grids: ContainerArray) -> Set[Widget]:
+        """
+        :param containers: containers of the placeholders, in the same order
+        """
 
         def location(indices: List[int]) -> Location:
             start = indices[0]
@@ -371,51 +779,48 @@ class Wireframe:
             quotient, remainder = divmod(index, columns)
             return remainder, quotient
 
-        rows, columns = self.shape()
+        rows, columns = shape
         widgets = set()
-        grids = self.grids()
+        if len(grids) == 0:
+            return widgets
 
-        unoccupied = range(len(grids))
-        for placeholder in self.placeholders:
-            occupied = [index for index, grid in enumerate(grids) if placeholder.occupies(grid, threshold=0.35)]
-            unoccupied = [index for index in unoccupied if index not in occupied]
+        occupancy = Wireframe.__occupancy(containers, grids, threshold=0.35)
+
+        for placeholder, occupied in zip(placeholders, occupancy):
+            occupied = np.flatnonzero(occupied).tolist()
             if len(occupied) == 0:
                 continue
 
-            widget = Widget(placeholder.contour, placeholder.tag, location(occupied))
+            # Outlines that are only the rectangle of the container are left to be computed when needed
+            contour = placeholder.contour if placeholder.outlined else None
+            widget = Widget(contour, placeholder.tag, location(occupied), placeholder.container)
             widgets.add(widget)
 
-        for index in unoccupied:
-            widget = PlaceholderWidget(grids[index].contour(), location([index]))
+        for index in np.flatnonzero(~occupancy.any(axis=0)).tolist():
+            widget = PlaceholderWidget(None, location([index]), grids[index], filler=True)
             widgets.add(widget)
 
         return widgets
 
-    def grids(self) -> List[Container]:
-        container = self.container()
-        rows, columns = self.shape()
+    @staticmethod
+    def __occupancy(containers: ContainerArray, grids: ContainerArray, threshold: float) -> np.ndarray:
+        """
+        Equivalent to `PlaceholderWidget.occupies`, for every placeholder and every grid at once.
 
-        if rows is 0 or columns is 0:
-            return []
+        :return: matrix of whether each placeholder (row) occupies each grid (column)
+        """
+        if not 1 > threshold > 0:
+            raise ValueError("'threshold' must be a value between 0 and 1")
 
-        grid_height = int(container.height / rows)
-        grid_width = int(container.width / columns)
+        ratio = containers.intersection_areas(grids) / grids.area()
+        return (1 >= ratio) & (ratio >= threshold)
 
-        grids = []
-        for i in range(rows):
-            y = container.y + (grid_height * i)
-            for j in range(columns):
-                x = container.x + (grid_width * j)
-                grid = Container(x, y, grid_width, grid_height)
-                grids.append(grid)
+    @staticmethod
+    def __grids(container: Container, shape: Tuple[int, int]) -> ContainerArray:
+        rows, columns = shape
 
-        return grids
+        if rows <= 0 or columns <= 0:
+            return ContainerArray.of([])
 
-    def container(self) -> Container:
-        if len(self.placeholders) == 0:
-            return Container.empty()
+        return ContainerArray.grid(container, rows, columns)
 
-        container = next(iter(self.placeholders)).container
-        for widget in self.placeholders:
-            container = container.union(widget.container)
-        return container
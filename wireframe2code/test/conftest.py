@@ -0,0 +1,14 @@
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope="module")
+def canvas():
+
+    def _make(width, height, color=(255, 255, 255)):
+        image = np.zeros((height, width, 3), np.uint8)
+        color = tuple(reversed(color))
+        image[:] = color
+        return image
+
+    return _make
@@ -0,0 +1,125 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+from cv2 import cv2
+
+from camera import Change
+from camera import Latest
+from camera import Pipeline
+
+
+def frames(count):
+    remaining = iter(range(count))
+
+    def read():
+        index = next(remaining, None)
+        # Frames arrive at most every millisecond, like a camera would deliver them
+        time.sleep(0.001)
+        return None if index is None else np.full((2, 2), index)
+
+    return read
+
+
+def test_change_ignores_camera_noise():
+    random = np.random.default_rng(7)
+    frame = np.full((480, 640, 3), 200, np.uint8)
+    change = Change(tolerance=8.)
+
+    assert change(frame)
+    noisy = np.clip(frame + random.normal(0, 6, frame.shape), 0, 255).astype(np.uint8)
+    assert not change(noisy)
+
+
+def test_change_notices_new_strokes():
+    frame = np.full((480, 640, 3), 200, np.uint8)
+    change = Change(tolerance=8.)
+    change(frame)
+
+    sketched = frame.copy()
+    cv2.rectangle(sketched, (100, 100), (200, 160), (0, 0, 0), thickness=3)
+    assert change(sketched)
+    assert not change(sketched)
+
+
+def test_change_adds_up_slow_changes():
+    change = Change(tolerance=8.)
+    assert change(np.full((480, 640), 200, np.uint8))
+
+    changes = [change(np.full((480, 640), 200 - level, np.uint8)) for level in range(1, 12)]
+    # Frames are compared to the last frame that changed, rather than the previous frame
+    assert changes == [False] * 8 + [True, False, False]
+
+
+def test_latest_drops_oldest_items():
+    latest = Latest(size=2)
+    for item in range(5):
+        latest.put(item)
+
+    assert latest.get(timeout=0) == 3
+    assert latest.get(timeout=0) == 4
+    assert latest.get(timeout=0) is None
+    assert latest.dropped == 3
+
+
+def test_latest_wakes_consumers_once_closed():
+    latest = Latest()
+    threading.Timer(0.05, latest.close).start()
+
+    assert latest.get() is None
+    assert latest.closed
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_pipeline_returns_newer_frames_only(workers):
+    def process(frame):
+        time.sleep(0.01)
+        return int(frame[0, 0])
+
+    shown = []
+    with Pipeline(frames(100), process, workers) as pipeline:
+        while not pipeline.done():
+            result = pipeline.get(timeout=0.1)
+            if result is not None:
+                frame, value = result
+                assert value == frame[0, 0]
+                shown.append(value)
+
+    assert shown == sorted(set(shown))
+    assert shown[-1] == 99
+    # Processing is slower than reading, so frames are dropped rather than queued
+    assert pipeline.read == 100
+    assert pipeline.processed < 100
+    assert pipeline.shown == len(shown)
+    assert pipeline.fps() > 0
+
+
+def test_pipeline_skips_unchanged_frames():
+    still = frames(10)
+
+    def read():
+        frame = still()
+        return None if frame is None else np.zeros((2, 2)) + (frame >= 5)
+
+    with Pipeline(read, lambda frame: frame[0, 0], changed=Change(tolerance=0.)) as pipeline:
+        values = []
+        while not pipeline.done():
+            result = pipeline.get(timeout=0.1)
+            if result is not None:
+                values.append(result[1])
+
+    assert values[-1] == 1
+    assert pipeline.read == 10
+    assert pipeline.skipped == 8
+    assert pipeline.processed == 2
+
+
+def test_pipeline_raises_errors_of_workers():
+    def process(frame):
+        raise ValueError("Unreadable frame")
+
+    with pytest.raises(ValueError, match="Unreadable frame"):
+        with Pipeline(frames(10), process) as pipeline:
+            while not pipeline.done():
+                pipeline.get(timeout=0.1)
@@ -0,0 +1,247 @@
+import os
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from cv2 import cv2
+
+from sketch.capture import Binarization
+from sketch.capture import Buffers
+from sketch.capture import Capture
+from sketch.capture import Scan
+from sketch.capture import Stage
+from sketch.capture import load
+from sketch.capture import read
+from sketch.capture import resize
+from sketch.wireframe import Wireframe
+
+
+@pytest.fixture(scope="module", params=[
+    'clean_wireframe_sketch.jpg',
+    'gapped_wireframe_sketch.jpg',
+    'cursed_wireframe_sketch.jpg',
+    'solid_shapes_with_colors.png'
+])
+def sketch(request):
+    path = os.path.join(os.path.dirname(__file__), 'resources', request.param)
+    yield cv2.imread(path)
+
+
+def test_vectorized_binarization_is_identical_to_block_by_block_binarization(sketch):
+    expected = Capture(sketch, vectorized=False).preprocess()[1]
+    actual = Capture(sketch, vectorized=True).preprocess()[1]
+    assert np.array_equal(actual, expected)
+
+
+def test_vectorized_softening_is_identical_to_block_by_block_softening(sketch):
+    expected = Capture(sketch, vectorized=False).preprocess()[2]
+    actual = Capture(sketch, vectorized=True).preprocess()[2]
+    assert np.array_equal(actual, expected)
+
+
+@pytest.mark.parametrize('tiles', [3, 16])
+@pytest.mark.parametrize('binarization', list(Binarization))
+def test_tiled_preprocessing_is_identical_to_serial_preprocessing(sketch, tiles, binarization):
+    expected = Capture(sketch, binarization=binarization).preprocess()
+    with ThreadPoolExecutor(4) as executor:
+        actual = Capture(sketch, binarization=binarization, executor=executor, tiles=tiles).preprocess()
+    assert all(np.array_equal(a, e) for a, e in zip(actual, expected))
+
+
+def test_stages_are_computed_once(sketch):
+    capture = Capture(sketch)
+    first = capture.preprocess()
+    second = capture.preprocess()
+    assert all(f is s for f, s in zip(first, second))
+    assert capture.stage('thinned') is first[-1]
+
+
+def test_invalidated_stages_are_recomputed(sketch):
+    capture = Capture(sketch)
+    gamma_corrected, _, _, _, dilated, thinned = capture.preprocess()
+    capture.invalidate('dilated')
+    assert capture.stage('gamma_corrected') is gamma_corrected
+    assert capture.stage('dilated') is not dilated
+    assert np.array_equal(capture.stage('thinned'), thinned)
+
+
+def test_only_retained_stages_are_kept(sketch):
+    capture = Capture(sketch, retain=['thinned'])
+    thinned = capture.stage('thinned')
+    assert capture.stage('thinned') is thinned
+    assert capture.stage('dilated') is not capture.stage('dilated')
+
+
+def test_stages_are_pulled_on_demand(sketch):
+    pulled = []
+
+    def thin(image):
+        pulled.append(image)
+        return image
+
+    capture = Capture(sketch, stages={'thinned': Stage(thin, 'dilated')})
+    capture.stage('inversed')
+    assert len(pulled) == 0
+    capture.contours()
+    assert len(pulled) == 1
+
+
+def test_contours_can_be_found_without_thinning(sketch):
+    capture = Capture(sketch, stages={'thinned': None})
+    assert capture.output() == 'dilated'
+    assert 'thinned' not in capture.stages
+    assert len(capture.contours()) == len(Capture(sketch).contours(stage='dilated'))
+
+
+@pytest.mark.parametrize('binarization', list(Binarization))
+def test_pooled_preprocessing_is_identical_to_preprocessing(sketch, binarization):
+    expected = Capture(sketch, binarization=binarization).preprocess()
+    buffers = Buffers()
+    for _ in range(2):
+        actual = Capture(sketch, binarization=binarization, buffers=buffers).preprocess()
+        assert all(np.array_equal(a, e) for a, e in zip(actual, expected))
+
+
+def test_pooled_captures_reuse_arrays_of_images_of_the_same_size(sketch):
+    buffers = Buffers()
+    frame = cv2.resize(sketch, (1280, 960))
+    first = Capture(frame, buffers=buffers)
+    first_outputs = first.preprocess()
+    allocations = buffers.allocations
+    first.release()
+
+    second = Capture(frame, buffers=buffers)
+    second_outputs = second.preprocess()
+    assert buffers.allocations == allocations
+    assert np.shares_memory(first.image, second.image)
+    # Thinning allocates its own output
+    assert all(np.shares_memory(f, s) for f, s in zip(first_outputs[:-1], second_outputs[:-1]))
+    second.release()
+
+    Capture(cv2.resize(sketch, (1280, 720)), buffers=buffers).preprocess()
+    assert buffers.allocations == 2 * allocations
+
+
+def test_pooled_captures_do_not_share_arrays_until_released(sketch):
+    buffers = Buffers()
+    with Capture(sketch, buffers=buffers) as first:
+        with Capture(sketch, buffers=buffers) as second:
+            first_output, second_output = first.preprocess()[0], second.preprocess()[0]
+            assert not np.shares_memory(first_output, second_output)
+        third_output = Capture(sketch, buffers=buffers).preprocess()[0]
+        assert np.shares_memory(second_output, third_output)
+        assert not np.shares_memory(first_output, third_output)
+
+
+def test_pooled_captures_only_allocate_temporary_arrays(sketch):
+    buffers = Buffers()
+    frame = cv2.resize(sketch, (1280, 720))
+    with Capture(frame, buffers=buffers) as capture:
+        capture.preprocess()
+
+    def allocated(buffers):
+        tracemalloc.start()
+        try:
+            with Capture(frame, buffers=buffers) as capture:
+                thinned = capture.preprocess()[-1]
+                kept, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return kept, peak, thinned.nbytes
+
+    kept, peak, thinned = allocated(buffers)
+    unpooled_kept, unpooled_peak, _ = allocated(None)
+    # Apart from the output of thinning, a pooled capture keeps little more than the arrays of its pool
+    assert kept < 2 * thinned < unpooled_kept
+    assert peak < unpooled_peak
+
+
+def test_capture_is_resized_by_width():
+    tall = np.zeros((800, 500, 3), np.uint8)
+    wide = np.zeros((500, 800, 3), np.uint8)
+    assert Capture(tall).image.shape == (800, 500, 3)
+    assert Capture(wide).image.shape == (400, 640, 3)
+    assert Capture(wide).scale == 640 / 800
+
+
+def test_large_images_are_decoded_at_reduced_resolution(tmp_path):
+    path = os.path.join(os.path.dirname(__file__), 'resources/clean_wireframe_sketch.jpg')
+    filename = str(tmp_path / 'large.jpg')
+    cv2.imwrite(filename, cv2.resize(cv2.imread(path), (4000, 3000)))
+
+    image, scale = read(filename)
+    assert image.shape == (750, 1000, 3)
+    assert scale == 0.25
+
+    capture = Capture(image, scale=scale)
+    assert capture.image.shape[1] == 640
+    assert capture.scale == 640 / 4000
+
+
+def test_large_png_images_are_shrunk_by_area_averaging(tmp_path):
+    image = np.full((2600, 2600, 3), 255, np.uint8)
+    for row in range(4):
+        for column in range(4):
+            x, y = 80 + column * 650, 80 + row * 650
+            cv2.rectangle(image, (x, y), (x + 480, y + 480), (0, 0, 0), 2)
+    filename = str(tmp_path / 'large.png')
+    cv2.imwrite(filename, image)
+
+    decoded, scale = read(filename)
+    assert np.array_equal(decoded, cv2.resize(image, (650, 650), interpolation=cv2.INTER_AREA))
+    assert scale == 0.25
+    # Strokes much thinner than the reduction are kept, rather than skipped over
+    assert len(Wireframe(Capture(decoded, scale=scale)).placeholders) == 16
+
+
+def test_small_images_are_decoded_at_full_resolution():
+    path = os.path.join(os.path.dirname(__file__), 'resources/solid_shapes_with_colors.png')
+    image, scale = read(path)
+    assert np.array_equal(image, cv2.imread(path))
+    assert scale == 1
+
+
+@pytest.mark.parametrize('tile_size', [80, 200, 400])
+def test_scanned_contours_match_captured_contours(sketch, tile_size):
+    image = resize(sketch)
+    expected = sorted(cv2.boundingRect(contour) for contour in Capture(image).contours()
+                      if cv2.arcLength(contour, True) >= 100)
+    scan = Scan(image, tile_size=tile_size, reduction=1)
+    actual = sorted(cv2.boundingRect(contour) for contour in scan.contours()
+                    if cv2.arcLength(contour, True) >= 100)
+    assert actual == expected
+    assert np.array_equal(scan.image, image)
+
+
+def test_scanned_strokes_across_tile_boundaries_keep_their_outline():
+    image = np.full((640, 640, 3), 255, np.uint8)
+    # An open shape across a vertical boundary, and a bent stroke across the corner of four tiles
+    cv2.polylines(image, [np.array([[250, 200], [250, 370], [420, 370], [420, 200]])], False, (0, 0, 0), 3)
+    cv2.polylines(image, [np.array([[280, 420], [360, 420], [360, 600]])], False, (0, 0, 0), 3)
+
+    def outlines(capture):
+        return sorted((cv2.boundingRect(contour), cv2.contourArea(contour)) for contour in capture.contours())
+
+    expected = outlines(Capture(image, transform=lambda image: image))
+    assert outlines(Scan(image, tile_size=320, reduction=1)) == expected
+    assert len(expected) == 2
+
+
+def test_scan_is_reduced_to_about_the_default_width(sketch):
+    scan = Scan(sketch, tile_size=200)
+    assert scan.image.shape[1] == sketch.shape[1] // scan.reduction
+    assert scan.scale == 1 / scan.reduction
+
+
+def test_images_can_be_loaded_without_being_read(tmp_path):
+    image = np.arange(6 * 4 * 3, dtype=np.uint8).reshape((6, 4, 3))
+
+    np.save(tmp_path / 'image.npy', image)
+    mapped = load(str(tmp_path / 'image.npy'))
+    assert isinstance(mapped, np.memmap)
+    assert np.array_equal(mapped, image)
+
+    (tmp_path / 'image.raw').write_bytes(b'header' + image.tobytes())
+    assert np.array_equal(load(str(tmp_path / 'image.raw'), image.shape, offset=6), image)
+    assert np.array_equal(load(image.tobytes(), image.shape), image)
@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+import pytest
+from cv2 import cv2
+
+from converter import Converter
+from sketch.capture import Binarization
+from sketch.capture import Buffers
+from sketch.capture import Capture
+from sketch.wireframe import Wireframe
+from web.writer import Html
+
+
+@pytest.fixture(scope="module")
+def images():
+    resources = os.path.join(os.path.dirname(__file__), 'resources')
+    clean = cv2.imread(os.path.join(resources, 'clean_wireframe_sketch.jpg'))
+    gapped = cv2.imread(os.path.join(resources, 'gapped_wireframe_sketch.jpg'))
+    cursed = cv2.imread(os.path.join(resources, 'cursed_wireframe_sketch.jpg'))
+    return [clean, gapped, np.ascontiguousarray(clean[::-1]), cursed, np.ascontiguousarray(clean[:, ::-1])]
+
+
+@pytest.mark.parametrize('binarization', list(Binarization))
+def test_converted_images_are_identical_to_images_converted_on_their_own(images, binarization):
+    converter = Converter(batch_size=4, binarization=binarization)
+
+    wireframes = list(converter.wireframes(images))
+
+    assert len(wireframes) == len(images)
+    for image, wireframe in zip(images, wireframes):
+        expected = Wireframe(Capture(image, binarization=binarization))
+        assert {widget.container for widget in wireframe.placeholders} == \
+               {widget.container for widget in expected.placeholders}
+        assert np.array_equal(wireframe.source, expected.source)
+
+
+def test_converted_html_is_identical_to_html_written_on_its_own(images):
+    converter = Converter()
+
+    documents = list(converter.html(images))
+
+    assert documents == [Html.render(Wireframe(Capture(image))) for image in images]
+
+
+def test_pooled_images_converted_together_do_not_share_arrays(images):
+    clean, cursed = images[0], images[3]
+    resized = cv2.resize(cursed, (clean.shape[1], clean.shape[0]))
+    converter = Converter(buffers=Buffers())
+
+    placeholders = [len(wireframe.placeholders) for wireframe in converter.wireframes([clean, resized])]
+
+    assert placeholders == [len(Wireframe(Capture(image)).placeholders) for image in [clean, resized]]
+    assert placeholders[0] == 7
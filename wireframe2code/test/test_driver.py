@@ -0,0 +1,78 @@
+import csv
+import os
+import shutil
+
+import pytest
+from cv2 import cv2
+
+import driver
+
+
+@pytest.fixture(scope="module")
+def resources():
+    return os.path.join(os.path.dirname(__file__), 'resources')
+
+
+def test_batch_converts_each_image_to_its_own_directory(resources, tmp_path):
+    images = tmp_path / 'images'
+    images.mkdir()
+    shutil.copy(os.path.join(resources, 'clean_wireframe_sketch.jpg'), images)
+    shutil.copy(os.path.join(resources, 'gapped_wireframe_sketch.jpg'), images)
+    (images / 'broken.png').write_bytes(b'not an image')
+    (images / 'notes.txt').write_text('not an image either')
+
+    output = tmp_path / 'output'
+    summaries = driver.consume_batch(str(images), str(output), jobs=2, in_flight=1)
+
+    statuses = {os.path.basename(summary['filename']): summary['status'] for summary in summaries}
+    assert statuses == {
+        'broken.png': 'failed',
+        'clean_wireframe_sketch.jpg': 'converted',
+        'gapped_wireframe_sketch.jpg': 'converted'
+    }
+    assert (output / 'clean_wireframe_sketch' / 'index.html').is_file()
+    assert (output / 'gapped_wireframe_sketch' / 'index.html').is_file()
+
+    with open(output / 'summary.csv', newline='') as file:
+        rows = list(csv.DictReader(file))
+    assert [row['status'] for row in rows] == [summary['status'] for summary in summaries]
+
+
+def test_batch_accepts_glob_patterns(resources, tmp_path):
+    summaries = driver.consume_batch(os.path.join(resources, '*_wireframe_sketch.jpg'), str(tmp_path), jobs=1)
+    assert len(summaries) == 3
+    assert all(summary['status'] == 'converted' for summary in summaries)
+
+
+@pytest.mark.parametrize('pyramid, scan', [(True, False), (False, True)])
+def test_nesting_is_rejected_with_pyramids_and_scans(resources, tmp_path, pyramid, scan):
+    image = os.path.join(resources, 'clean_wireframe_sketch.jpg')
+    with pytest.raises(ValueError):
+        driver.write_html(cv2.imread(image), str(tmp_path), pyramid=pyramid, scan=scan, nested=True)
+    with pytest.raises(ValueError):
+        driver.consume_batch(image, str(tmp_path), jobs=1, pyramid=pyramid, scan=scan, nested=True)
+    assert not (tmp_path / 'index.html').exists()
+    assert not (tmp_path / 'summary.csv').exists()
+
+
+@pytest.mark.parametrize('pipelined', [False, True])
+def test_still_sketches_are_tracked_when_unchanged_frames_are_skipped(resources, tmp_path, monkeypatch, pipelined):
+    frame = cv2.imread(os.path.join(resources, 'clean_wireframe_sketch.jpg'))
+
+    class Camera:
+        def __init__(self, index):
+            self.frames = [frame] * 30
+
+        def read(self):
+            return (True, self.frames.pop()) if len(self.frames) > 0 else (False, None)
+
+        def release(self):
+            pass
+
+    monkeypatch.setattr(driver.cv2, 'VideoCapture', Camera)
+    monkeypatch.setattr(driver.cv2, 'waitKey', lambda delay: -1)
+    monkeypatch.setattr(driver.cv2, 'destroyAllWindows', lambda: None)
+    monkeypatch.setattr(driver, 'preview_widgets', lambda image, wireframe: None)
+
+    driver.consume_camera(str(tmp_path), pipelined=pipelined, tolerance=8, tracked=True)
+    assert (tmp_path / 'index.html').is_file()
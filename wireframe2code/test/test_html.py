@@ -6,6 +6,8 @@ from cv2 import cv2
 
 import file
 from sketch.capture import Capture
+from sketch.wireframe import Container
+from sketch.wireframe import PlaceholderWidget
 from sketch.wireframe import Wireframe, Location
 from web.writer import Html
 from web.writer import sort
@@ -75,3 +77,58 @@ def test_copy_assets_to_destination_directory(wireframe, tempdir):
         'bootstrap.min.css',
         'bootstrap.min.js'
     }
+
+
+def test_generate_nested_html_file_from_wireframe(canvas, tempdir):
+    image = canvas(640, 640)
+    Container(20, 20, 290, 600).draw(image, color=(0, 0, 0), thickness=3)
+    for row in range(3):
+        for column in range(2):
+            Container(40 + column * 130, 40 + row * 190, 110, 170).draw(image, color=(0, 0, 0), thickness=3)
+    Container(330, 20, 290, 290).draw(image, color=(0, 0, 0), thickness=3)
+    Container(330, 330, 290, 290).draw(image, color=(0, 0, 0), thickness=3)
+
+    html = Html(Path(tempdir) / 'nested')
+    html.write(Wireframe(Capture(image), nested=True))
+
+    with open(Path(tempdir) / 'nested' / 'index.html', 'r') as file:
+        document = BeautifulSoup(file, 'html.parser')
+
+    wrapper = document.find('div', class_='wrapper')
+    blocks = wrapper.find_all('div', class_='block', recursive=False)
+    assert len(blocks) == 3
+
+    nested = [block.find('div', class_='wrapper') for block in blocks if block.find('div', class_='wrapper')]
+    assert len(nested) == 1
+    assert len(nested[0].find_all('div', class_='block', recursive=False)) == 6
+
+
+def test_nested_layouts_are_only_looked_up_at_their_own_level():
+    def placeholders(*containers):
+        return [PlaceholderWidget(None, container=container) for container in containers]
+
+    outer, other = Container(0, 0, 300, 300), Container(400, 0, 300, 300)
+    # A placeholder nested in one rectangle, which happens to have the same container as another rectangle
+    inner = Wireframe.of(placeholders(other))
+    children = {outer: inner, other: Wireframe.of(placeholders(Container(410, 10, 100, 100),
+                                                              Container(590, 10, 100, 100)))}
+
+    document = BeautifulSoup(Html.render(Wireframe.of(placeholders(outer, other), children=children)), 'html.parser')
+
+    blocks = document.find('div', class_='wrapper').find_all('div', class_='block', recursive=False)
+    nested = [block.find('div', class_='wrapper') for block in blocks]
+    assert [len(wrapper.find_all('div', class_='block', recursive=False)) for wrapper in nested] == [1, 2]
+    assert nested[0].find('div', class_='wrapper') is None
+
+
+@pytest.mark.parametrize('nested', [False, True])
+def test_lean_and_full_wireframes_render_the_same_html(nested):
+    path = os.path.join(os.path.dirname(__file__), 'resources/clean_wireframe_sketch.jpg')
+    image = cv2.imread(path)
+    expected = Html.render(Wireframe(Capture(image), nested=nested))
+    actual = Html.render(Wireframe(Capture(image, retain=()), nested=nested, lean=True))
+    assert actual == expected
+
+    document = BeautifulSoup(actual, 'html.parser')
+    assert len(document.find_all('div', class_='block')) == 7
+    assert document.find_all('div', class_='placeholder') == []
@@ -0,0 +1,50 @@
+import os
+
+import numpy as np
+import pytest
+from cv2 import cv2
+
+from sketch.capture import Capture
+from sketch.shape import are_rectangles
+from sketch.shape import is_rectangle
+
+
+@pytest.fixture(scope="module", params=[
+    'clean_wireframe_sketch.jpg',
+    'cursed_wireframe_sketch.jpg',
+    'clean_shapes.jpg'
+])
+def contours(request):
+    path = os.path.join(os.path.dirname(__file__), 'resources', request.param)
+    capture = Capture(cv2.imread(path))
+    yield capture.contours() + capture.contours(stage='adaptively_binarized')
+
+
+def test_batch_classification_agrees_with_single_classification(contours):
+    expected = [is_rectangle(contour) for contour in contours]
+    assert list(are_rectangles(contours)) == expected
+
+
+def test_batch_classification_applies_minimum_perimeter(contours):
+    expected = [cv2.arcLength(contour, True) >= 100 and is_rectangle(contour) for contour in contours]
+    assert list(are_rectangles(contours, minimum_perimeter=100)) == expected
+
+
+def test_batch_classification_rejects_elongated_rectangles():
+    contours = [
+        np.array([[[0, 0]], [[99, 0]], [[99, 9]], [[0, 9]]], dtype=np.int32),
+        np.array([[[0, 0]], [[99, 0]], [[99, 49]], [[0, 49]]], dtype=np.int32)
+    ]
+    assert list(are_rectangles(contours)) == [True, True]
+    assert list(are_rectangles(contours, maximum_aspect_ratio=5)) == [False, True]
+
+
+def test_batch_classification_of_large_coordinates():
+    rectangle = np.array([[[0, 0]], [[400, 0]], [[400, 300]], [[0, 300]]], dtype=np.int32)
+    contours = [rectangle + 50000, rectangle + 10000000, rectangle * 150]
+    assert list(are_rectangles(contours, minimum_perimeter=100)) == [is_rectangle(contour) for contour in contours]
+    assert all(are_rectangles(contours, minimum_perimeter=100))
+
+
+def test_batch_classification_of_no_contours():
+    assert len(are_rectangles([])) == 0
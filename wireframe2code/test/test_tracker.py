@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+import pytest
+from bs4 import BeautifulSoup
+from cv2 import cv2
+
+from sketch.capture import Capture
+from sketch.tracker import Tracker
+from sketch.wireframe import Container
+from sketch.wireframe import PlaceholderWidget
+from sketch.wireframe import Wireframe
+from web.writer import Html
+
+
+def detect(*containers):
+    return [PlaceholderWidget(None, container=Container(*container)) for container in containers]
+
+
+def test_placeholders_are_shown_once_detected_in_enough_frames():
+    tracker = Tracker(appear=2)
+
+    assert not tracker.update(detect((0, 0, 100, 100)))
+    assert tracker.wireframe.placeholders == set()
+    assert tracker.update(detect((1, 0, 100, 100)))
+    assert len(tracker.wireframe.placeholders) == 1
+
+
+def test_single_detections_are_ignored():
+    tracker = Tracker(appear=2)
+    tracker.update(detect((0, 0, 100, 100)))
+    tracker.update(detect((0, 0, 100, 100)))
+
+    assert not tracker.update(detect((0, 0, 100, 100), (300, 300, 50, 50)))
+    assert not tracker.update(detect((0, 0, 100, 100)))
+    assert len(tracker.tracks) == 1
+
+
+def test_placeholders_keep_their_identity_and_place_while_jittering():
+    random = np.random.default_rng(3)
+    tracker = Tracker()
+    tracker.update(detect((0, 0, 100, 100), (200, 0, 100, 100)))
+    tracker.update(detect((0, 0, 100, 100), (200, 0, 100, 100)))
+    identities = [track.identity for track in tracker.tracks]
+    placeholders = set(tracker.wireframe.placeholders)
+    layout = tracker.wireframe.layout()
+
+    for _ in range(20):
+        jitter = random.integers(-2, 3, size=(2, 4))
+        changed = tracker.update(detect(*(np.array([(0, 0, 100, 100), (200, 0, 100, 100)]) + jitter)))
+        assert not changed
+
+    assert [track.identity for track in tracker.tracks] == identities
+    assert tracker.wireframe.placeholders == placeholders
+    assert tracker.wireframe.layout() is layout
+
+
+def test_placeholders_linger_when_missed():
+    tracker = Tracker(disappear=3)
+    for _ in range(2):
+        tracker.update(detect((0, 0, 100, 100), (200, 0, 100, 100)))
+
+    assert not tracker.update(detect((0, 0, 100, 100)))
+    assert not tracker.update(detect((0, 0, 100, 100)))
+    assert tracker.update(detect((0, 0, 100, 100)))
+    assert {placeholder.container for placeholder in tracker.wireframe.placeholders} == {Container(0, 0, 100, 100)}
+
+
+@pytest.mark.parametrize('window', [1, 5])
+def test_moved_placeholders_are_placed_again(window):
+    tracker = Tracker(window=window)
+    for _ in range(2):
+        tracker.update(detect((0, 0, 100, 100)))
+    identity = tracker.tracks[0].identity
+
+    changed = [tracker.update(detect((20, 0, 100, 100))) for _ in range(window)]
+
+    assert any(changed)
+    assert tracker.tracks[0].identity == identity
+    assert {placeholder.container for placeholder in tracker.wireframe.placeholders} == {Container(20, 0, 100, 100)}
+
+
+def test_tracked_placeholders_render_as_detected_blocks():
+    path = os.path.join(os.path.dirname(__file__), 'resources', 'clean_wireframe_sketch.jpg')
+    wireframe = Wireframe(Capture(cv2.imread(path)))
+    tracker = Tracker()
+    for _ in range(3):
+        tracker.update(wireframe.placeholders)
+
+    document = BeautifulSoup(Html.render(tracker.wireframe), 'html.parser')
+    assert len(document.find_all('div', class_='block')) == 7
+    assert document.find_all('div', class_='placeholder') == []
+    assert Html.render(tracker.wireframe) == Html.render(wireframe)
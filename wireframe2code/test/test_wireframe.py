@@ -5,10 +5,18 @@ import pytest
 from cv2 import cv2
 from pytest import fail
 
+from sketch.capture import Binarization
 from sketch.capture import Capture
+from sketch.capture import Pyramid
+from sketch.capture import Scan
+from sketch.capture import resize
 from sketch.wireframe import Container
+from sketch.wireframe import ContainerArray
+from sketch.wireframe import Detector
+from sketch.wireframe import Inference
 from sketch.wireframe import Wireframe
 from sketch.wireframe import Location
+from sketch.wireframe import PlaceholderWidget
 
 
 @pytest.fixture(scope="module")
@@ -23,18 +31,6 @@ def gapped_wireframe_sketch():
     yield cv2.imread(path)
 
 
-@pytest.fixture(scope="module")
-def canvas():
-
-    def _make(width, height, color=(255, 255, 255)):
-        image = np.zeros((height, width, 3), np.uint8)
-        color = tuple(reversed(color))
-        image[:] = color
-        return image
-
-    return _make
-
-
 def test_container_points_are_returned_in_clockwise_order():
     container = Container(0, 0, 5, 5)
     assert container.points() == tuple([(0, 0), (4, 0), (4, 4), (0, 4)])
@@ -144,3 +140,272 @@ def test_widget_locations_of_gapped_wireframe_sketch(gapped_wireframe_sketch):
     }
 
     assert actual == expected
+
+
+def test_widget_locations_of_clean_wireframe_sketch_without_thinning(wireframe_sketch):
+    capture = Capture(wireframe_sketch, stages={'thinned': None})
+    wireframe = Wireframe(capture)
+    assert len(wireframe.placeholders) == 7
+    assert wireframe.shape() == (4, 4)
+
+
+@pytest.mark.parametrize('binarization', list(Binarization))
+def test_widget_locations_of_clean_wireframe_sketch_per_binarization(wireframe_sketch, binarization):
+    capture = Capture(wireframe_sketch, binarization=binarization)
+    wireframe = Wireframe(capture)
+    actual = {widget.location for widget in wireframe.widgets()}
+    expected = {
+        Location((0, 0), (1, 1)),
+        Location((0, 2)),
+        Location((0, 3), (2, 3)),
+        Location((2, 0)),
+        Location((2, 1)),
+        Location((1, 2), (2, 2)),
+        Location((3, 0), (3, 3))
+    }
+    assert actual == expected
+
+
+@pytest.mark.parametrize('binarization', list(Binarization))
+def test_widget_locations_of_gapped_wireframe_sketch_per_binarization(gapped_wireframe_sketch, binarization):
+    capture = Capture(gapped_wireframe_sketch, binarization=binarization)
+    wireframe = Wireframe(capture)
+    actual = {widget.location for widget in wireframe.widgets()}
+    expected = {
+        Location((0, 0), (0, 2)),
+        Location((1, 0)),
+        Location((2, 0)),
+        Location((1, 1)),
+        Location((2, 1)),
+        Location((1, 2), (2, 2))
+    }
+    assert actual == expected
+
+
+def test_can_detect_elements_correctly_of_clean_wireframe_sketch_from_components(wireframe_sketch):
+    capture = Capture(wireframe_sketch)
+    wireframe = Wireframe(capture, detector=Detector.COMPONENTS)
+    assert len(wireframe.placeholders) == 7
+
+
+def test_components_and_contours_agree_on_widget_locations(wireframe_sketch, gapped_wireframe_sketch):
+    for sketch in [wireframe_sketch, gapped_wireframe_sketch]:
+        capture = Capture(sketch)
+        expected = {widget.location for widget in Wireframe(capture).widgets()}
+        actual = {widget.location for widget in Wireframe(capture, detector=Detector.COMPONENTS).widgets()}
+        assert actual == expected
+
+
+def test_rectangles_found_from_components_are_not_empty(wireframe_sketch):
+    wireframe = Wireframe(Capture(wireframe_sketch), detector=Detector.COMPONENTS)
+    detected = {placeholder.container for placeholder in wireframe.placeholders}
+    widgets = [widget for widget in wireframe.widgets() if widget.container in detected]
+    assert len(widgets) == 7
+    assert not any(widget.empty() for widget in widgets)
+
+
+def test_pyramid_and_resized_capture_agree_on_widget_locations(wireframe_sketch, gapped_wireframe_sketch):
+    for sketch in [wireframe_sketch, gapped_wireframe_sketch]:
+        expected = {widget.location for widget in Wireframe(Capture(sketch)).widgets()}
+        actual = {widget.location for widget in Wireframe(Pyramid(sketch)).widgets()}
+        assert actual == expected
+
+
+def test_pyramid_finds_placeholders_at_full_resolution(wireframe_sketch):
+    wireframe = Wireframe(Pyramid(wireframe_sketch))
+    height, width = wireframe_sketch.shape[:2]
+    assert len(wireframe.placeholders) == 7
+    assert max(placeholder.container.x + placeholder.container.width for placeholder in wireframe.placeholders) > 640
+    assert all(placeholder.container.x + placeholder.container.width <= width and
+               placeholder.container.y + placeholder.container.height <= height
+               for placeholder in wireframe.placeholders)
+
+
+def test_pyramid_finds_thin_strokes_of_large_sketches():
+    sketch = np.full((2600, 2600, 3), 255, np.uint8)
+    for row in range(4):
+        for column in range(4):
+            x, y = 80 + column * 650, 80 + row * 650
+            cv2.rectangle(sketch, (x, y), (x + 480, y + 480), (160, 160, 160), 4)
+    assert len(Wireframe(Capture(sketch)).placeholders) == 16
+    assert len(Wireframe(Pyramid(sketch)).placeholders) == 16
+
+
+def test_scan_and_capture_agree_on_widget_locations(wireframe_sketch, gapped_wireframe_sketch):
+    for sketch in [wireframe_sketch, gapped_wireframe_sketch]:
+        expected = {widget.location for widget in Wireframe(Capture(sketch)).widgets()}
+        actual = {widget.location for widget in Wireframe(Scan(resize(sketch), tile_size=120, reduction=1)).widgets()}
+        assert actual == expected
+
+
+@pytest.mark.parametrize('options', [{'nested': True}, {'detector': Detector.COMPONENTS}])
+def test_scans_are_rejected_where_a_whole_capture_is_needed(wireframe_sketch, options):
+    with pytest.raises(ValueError):
+        Wireframe(Scan(resize(wireframe_sketch), tile_size=120, reduction=1), **options)
+
+
+def test_layout_is_inferred_once(wireframe_sketch):
+    wireframe = Wireframe(Capture(wireframe_sketch))
+    layout = wireframe.layout()
+    assert wireframe.layout() is layout
+    assert wireframe.shape() == layout.shape
+    assert wireframe.grids() == list(layout.grids)
+    assert wireframe.widgets() == set(layout.widgets)
+
+
+def test_layout_is_inferred_again_when_placeholders_change(wireframe_sketch):
+    wireframe = Wireframe(Capture(wireframe_sketch))
+    layout = wireframe.layout()
+
+    removed = wireframe.placeholders.pop()
+    assert removed.container in {widget.container for widget in layout.widgets}
+    assert removed.container not in {widget.container for widget in wireframe.layout().widgets}
+
+    layout = wireframe.layout()
+    wireframe.invalidate()
+    assert wireframe.layout() is not layout
+
+
+@pytest.mark.parametrize('inference', list(Inference))
+def test_widget_locations_of_dense_grid(canvas, inference):
+    image = canvas(640, 640)
+    missing = {(1, 2), (4, 0), (6, 6)}
+    for row in range(8):
+        for column in range(8):
+            if (column, row) not in missing:
+                container = Container(20 + column * 75, 20 + row * 75, 60, 60)
+                container.draw(image, color=(0, 0, 0), thickness=3)
+
+    wireframe = Wireframe(Capture(image), inference=inference)
+    widgets = wireframe.widgets()
+    assert wireframe.shape() == (8, 8)
+    assert {widget.location for widget in widgets} == {Location((c, r)) for r in range(8) for c in range(8)}
+    assert {widget.location for widget in widgets if widget.empty()} == {Location(cell) for cell in missing}
+
+
+@pytest.mark.parametrize('inference', list(Inference))
+def test_grid_shape_of_table(canvas, inference):
+    image = canvas(640, 720)
+    for row in range(24):
+        for column in range(12):
+            container = Container(20 + column * 50, 20 + row * 28, 40, 18)
+            container.draw(image, color=(0, 0, 0), thickness=2)
+
+    wireframe = Wireframe(Capture(image), inference=inference)
+    assert len(wireframe.placeholders) == 24 * 12
+    assert wireframe.shape() == (24, 12)
+
+
+def test_profiles_and_gaps_agree_on_widget_locations(wireframe_sketch, gapped_wireframe_sketch):
+    for sketch in [wireframe_sketch, gapped_wireframe_sketch]:
+        capture = Capture(sketch)
+        expected = {widget.location for widget in Wireframe(capture).widgets()}
+        actual = {widget.location for widget in Wireframe(capture, inference=Inference.PROFILES).widgets()}
+        assert actual == expected
+
+
+def test_profiles_count_empty_rows(canvas):
+    image = canvas(640, 640)
+    for row in [0, 1, 3, 4]:
+        for column in range(5):
+            container = Container(20 + column * 120, 20 + row * 120, 100, 100)
+            container.draw(image, color=(0, 0, 0), thickness=3)
+
+    wireframe = Wireframe(Capture(image), inference=Inference.PROFILES)
+    assert wireframe.shape() == (5, 5)
+
+
+def test_container_array_matches_containers():
+    containers = [Container(0, 0, 100, 100), Container(75, 75, 100, 100), Container(300, 10, 20, 40)]
+    other = Container(50, 60, 200, 30)
+    array = ContainerArray.of(containers)
+
+    assert list(array) == containers
+    assert list(array.intersection(other)) == [container.intersection(other) for container in containers]
+    assert list(array.union(other)) == [container.union(other) for container in containers]
+    assert array.area().tolist() == [10000, 10000, 800]
+    assert array.center().tolist() == [list(container.center()) for container in containers]
+
+    bounds = containers[0]
+    for container in containers:
+        bounds = bounds.union(container)
+    assert array.bounds() == bounds
+    assert ContainerArray.of([]).bounds() == Container.empty()
+
+
+def test_container_array_pairwise_overlap():
+    array = ContainerArray.of([Container(0, 0, 10, 10), Container(5, 0, 10, 10)])
+    assert array.intersection_areas(array).tolist() == [[100, 50], [50, 100]]
+    assert np.allclose(array.iou(array), [[1, 50 / 150], [50 / 150, 1]])
+
+
+@pytest.mark.parametrize('offset', [(55, 55), (55, 0)])
+def test_overlapping_placeholders_have_no_grids(canvas, offset):
+    # Placeholders which overlap by less than they are merged by count negative rows or columns
+    x, y = offset
+    wireframe = Wireframe(Capture(canvas(640, 640)))
+    wireframe.placeholders = {PlaceholderWidget(Container(0, 0, 100, 100).contour()),
+                              PlaceholderWidget(Container(x, y, 100, 100).contour())}
+
+    assert min(wireframe.shape()) < 0
+    assert wireframe.grids() == []
+    assert wireframe.widgets() == set()
+
+
+def test_widget_from_container_has_outline_of_container():
+    container = Container(10, 5, 5, 5)
+    widget = PlaceholderWidget(None, container=container)
+    assert not widget.outlined
+    assert widget.container == container
+    assert np.array_equal(widget.contour, container.contour())
+
+
+def test_only_fillers_are_empty():
+    contour = np.array([[[10, 5]], [[14, 5]], [[14, 9]], [[10, 9]]])
+    container = Container(10, 5, 5, 5)
+    assert not PlaceholderWidget(contour).empty()
+    assert not PlaceholderWidget(container.contour()).empty()
+    assert not PlaceholderWidget(None, container=container).empty()
+    assert PlaceholderWidget(None, container=container, filler=True).empty()
+
+
+def test_nested_rectangles_are_laid_out_in_their_own_grids(canvas):
+    image = canvas(640, 640)
+    Container(20, 20, 290, 600).draw(image, color=(0, 0, 0), thickness=3)
+    for row in range(3):
+        for column in range(2):
+            Container(40 + column * 130, 40 + row * 190, 110, 170).draw(image, color=(0, 0, 0), thickness=3)
+    Container(330, 20, 290, 290).draw(image, color=(0, 0, 0), thickness=3)
+    Container(330, 330, 290, 290).draw(image, color=(0, 0, 0), thickness=3)
+
+    wireframe = Wireframe(Capture(image), nested=True)
+    layout = wireframe.layout()
+    assert layout.shape == (2, 2)
+    assert len(wireframe.placeholders) == 3
+    assert len(layout.children) == 1
+
+    panel = next(widget for widget in layout.widgets if widget.location == Location((0, 0), (0, 1)))
+    child = layout.child(panel)
+    assert child.shape == (3, 2)
+    assert {widget.location for widget in child.widgets} == {Location((c, r)) for r in range(3) for c in range(2)}
+
+
+def test_nested_and_outermost_layouts_agree_without_nesting(wireframe_sketch, gapped_wireframe_sketch):
+    for sketch in [wireframe_sketch, gapped_wireframe_sketch]:
+        capture = Capture(sketch)
+        expected = {widget.location for widget in Wireframe(capture).widgets()}
+        actual = {widget.location for widget in Wireframe(capture, nested=True).widgets()}
+        assert actual == expected
+
+
+@pytest.mark.parametrize('nested', [False, True])
+def test_lean_and_full_wireframes_agree_on_widgets(wireframe_sketch, gapped_wireframe_sketch, nested):
+    for sketch in [wireframe_sketch, gapped_wireframe_sketch]:
+        expected = Wireframe(Capture(sketch), nested=nested)
+        actual = Wireframe(Capture(sketch, retain=()), nested=nested, lean=True)
+        assert {(widget.container, widget.location) for widget in actual.widgets()} == \
+               {(widget.container, widget.location) for widget in expected.widgets()}
+        assert actual.source is None
+        assert not any(placeholder.outlined for placeholder in actual.placeholders)
+        assert {widget.location for widget in actual.widgets() if not widget.empty()} == \
+               {widget.location for widget in expected.widgets() if not widget.empty()}
@@ -1,7 +1,11 @@
 import os
+from functools import lru_cache
 from pathlib import Path
 from typing import List
+from typing import Optional
+from typing import Tuple
 
+from sketch.wireframe import Layout
 from sketch.wireframe import Widget
 from sketch.wireframe import Wireframe
 from file import write
@@ -37,6 +41,23 @@ def sort(widgets):
     return sorted_widgets
 
 
+def nest(layout: Layout) -> List[Tuple[Widget, Optional[dict]]]:
+    """
+    :return: sorted widgets of the provided layout, each with the widgets, rows and columns of the layout
+    nested within it, if any; layouts are nested level by level, so that each one is only looked up among the
+    layouts of its own level
+    """
+    nested = []
+    for widget in sort(layout.widgets):
+        child = layout.child(widget)
+        if child is None:
+            nested.append((widget, None))
+            continue
+        rows, columns = child.shape
+        nested.append((widget, {'widgets': nest(child), 'rows': rows, 'columns': columns}))
+    return nested
+
+
 class Html:
 
     def __init__(self, directory):
@@ -51,6 +72,29 @@ class Html:
     def __template_filename():
         return 'index.html'
 
+    @classmethod
+    @lru_cache(maxsize=None)
+    def __template(cls) -> Template:
+        """
+        Loads and compiles the template once, for every document written afterwards.
+        """
+        file_loader = FileSystemLoader(cls.__resources_directory())
+        environment = Environment(loader=file_loader)
+        environment.trim_blocks = True
+
+        return environment.get_template(cls.__template_filename())
+
+    @classmethod
+    def render(cls, wireframe: Wireframe) -> str:
+        """
+        :return: HTML document of the provided wireframe
+        """
+        layout = wireframe.layout()
+        widgets = nest(layout)
+        rows, columns = layout.shape
+
+        return cls.__template().render(widgets=widgets, rows=rows, columns=columns)
+
     @classmethod
     def __assets(cls):
         filenames = {
@@ -68,17 +112,6 @@ class Html:
         def create_directory():
             self.directory.mkdir(parents=True, exist_ok=True)
 
-        def generate_html():
-            widgets = sort(wireframe.widgets())
-            rows, columns = wireframe.shape()
-
-            file_loader = FileSystemLoader(self.__resources_directory())
-            environment = Environment(loader=file_loader)
-            environment.trim_blocks = True
-
-            template = environment.get_template(self.__template_filename())
-            return template.render(widgets=widgets, rows=rows, columns=columns)
-
         def write_html():
             filename = (self.directory / 'index.html').resolve()
             with open(filename, 'w') as file:
@@ -90,7 +123,7 @@ class Html:
                 copy2(asset, self.directory)
 
         create_directory()
-        html = generate_html()
+        html = self.render(wireframe)
         write_html()
         copy_assets()
 